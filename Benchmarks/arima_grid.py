@@ -0,0 +1,37 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import tempfile
+from dataclean import MODELS
+from arimacache import WARM_START_DAYS
+from arimagrid import grid_search, best_orders
+
+def generate_pivot(days, models, seed=0):
+    # Random-walk daily prices for the given models, shaped like the scripts' forward-filled pivot
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-06-01', periods=days, freq='D')
+    prices = 600 + np.cumsum(rng.normal(0, 5, size=(days, len(models))), axis=0)
+    return pd.DataFrame(prices, index=index, columns=pd.Index(models, name='Model'))
+
+def main():
+    # Ten registry models with two months of daily prices, the full 12-order grid each
+    pivot = generate_pivot(60, MODELS[:10])
+    tables = []
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        search = grid_search(pivot, timeout=60, workers=workers)
+        print(f"{workers:2d} workers: {time.perf_counter() - start:.2f}s for {len(search['results'])} fits")
+        tables.append(best_orders(search['results']))
+    print(tables[-1])
+    print(f"Same best orders for every worker count: {all(table.equals(tables[0]) for table in tables)}")
+
+    # The same grid through a fit cache: filled, re-read, then with a series three days longer
+    with tempfile.TemporaryDirectory() as cache_directory:
+        for label, days, warm_start_days in [('cold cache', 60, 0), ('warm cache', 60, 0), ('3 days more, warm start', 63, WARM_START_DAYS)]:
+            start = time.perf_counter()
+            search = grid_search(generate_pivot(days, MODELS[:10]), timeout=60, cache_directory=cache_directory, warm_start_days=warm_start_days)
+            print(f"{label}: {time.perf_counter() - start:.2f}s, {int(search['results']['Cached'].sum())} of {len(search['results'])} fits cached")
+
+if __name__ == "__main__":
+    main()
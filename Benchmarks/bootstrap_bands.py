@@ -0,0 +1,30 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+from dataclean import MODELS
+from bootstrapbands import bootstrap_models
+
+# Bootstrap bands for every registry model, sequentially and over a process pool
+
+def generate_listings(dates, listings_per_model, seed=0):
+    # Every registry model with listings_per_model listings spread over the dates
+    rng = np.random.default_rng(seed)
+    count = listings_per_model * len(MODELS)
+    return pd.DataFrame({
+        'Date': pd.Timestamp('2024-06-01') + pd.to_timedelta(rng.integers(0, dates, size=count), unit='D'),
+        'Model': np.repeat(MODELS, listings_per_model),
+        'listing_price': np.round(rng.lognormal(6, 0.3, size=count), 2)
+    })
+
+def main():
+    # Roughly the shipped history: 25 days and a few hundred listings for every registry model
+    data = generate_listings(25, 400)
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        bands = bootstrap_models(data, MODELS, 7, resamples=1000, workers=workers)
+        print(f"{workers:2d} workers: {time.perf_counter() - start:.2f}s for 1000 resamples x {len(MODELS)} models")
+    print(bands['iPhone 12'].head())
+
+if __name__ == "__main__":
+    main()
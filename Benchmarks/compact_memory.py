@@ -0,0 +1,41 @@
+import pandas as pd
+import os
+from dataclean import get_combined_clean_data, compact_listings
+
+# Use the snapshots shipped with the repository, repeated to simulate a longer history
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data')
+model_prefixes = {
+    'iPhone 8': ['iphone_8_2024-'],
+    'iPhone X/Xs/Xr': ['iphone_X_2024-', 'iphone_Xs_2024-', 'iphone_Xr_2024-'],
+    'iPhone 11': ['iphone_11_2024-'],
+    'iPhone 12': ['iphone_12_2024-'],
+    'iPhone 13': ['iphone_13_2024-'],
+    'iPhone 14': ['iphone_14_2024-'],
+    'iPhone 15': ['iphone_15_2024-']
+}
+scale_factor = 100
+
+def scale_up(data, factor):
+    # Each copy is shifted past the previous one so the dates keep growing like a real history
+    span = data['date'].max() - data['date'].min() + pd.Timedelta(days=1)
+    return pd.concat([data.assign(date=data['date'] + i * span) for i in range(factor)], ignore_index=True)
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+def main():
+    data = scale_up(get_combined_clean_data(directory, model_prefixes), scale_factor)
+    layouts = {
+        'current layout': data,
+        'compact, float32 prices': compact_listings(data),
+        'compact, int32 cents': compact_listings(data, cents=True),
+        'compact, with encoded text': compact_listings(data, text_columns=['Link', 'Description'])
+    }
+    current = megabytes(data)
+    print(f"{len(data)} listings")
+    for name, df in layouts.items():
+        size = megabytes(df)
+        print(f"{name:28s} {size:9.1f} MB  ({size / current:.1%} of current)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import pandas as pd
+import numpy as np
+import time
+from orderstatistics import rolling_order_statistic, SORT_CROSSOVER_DAYS, SORT_CROSSOVER_LISTINGS
+
+# Robust rolling statistics from the order index against sorting every window from scratch, and the
+# method rolling_order_statistic picks by default
+
+def generate_listings(dates, listings_per_date, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.repeat(pd.date_range('2024-01-01', periods=dates, freq='D'), listings_per_date)
+    prices = np.round(rng.lognormal(6, 0.3, size=len(days)), 2)
+    return pd.DataFrame({'Date': days, 'listing_price': prices})
+
+def main():
+    # A year of one model x capacity series with 1,000 listings a day; a 90-day window holds 90,000 listings
+    data = generate_listings(365, 1000)
+    for rollback_days in [7, 14, 30, 90]:
+        seconds = {}
+        medians = {}
+        for method in ['index', 'sort']:
+            start = time.perf_counter()
+            medians[method] = rolling_order_statistic(data, rollback_days, 'median', method=method)['Rolled Price'].to_numpy()
+            rolling_order_statistic(data, rollback_days, 'trimmed_mean', method=method)
+            seconds[method] = time.perf_counter() - start
+        default = 'index' if rollback_days >= SORT_CROSSOVER_DAYS and rollback_days * 1000 >= SORT_CROSSOVER_LISTINGS else 'sort'
+        print(f"{rollback_days:2d}-day median and trimmed mean: order index {seconds['index']:.3f}s, re-sorting {seconds['sort']:.3f}s, "
+              f"default {default}, max difference {np.abs(medians['index'] - medians['sort']).max():.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import pandas as pd
 import os
-from dataclean import get_combined_clean_data
+from dataclean import iter_clean_listings
+from descriptives import stream_descriptives
 
 # Set the directory and model prefixes
 directory = r'C:\Users\nicop\anaconda3\Scraping\mpscraper\ScrapeFiles'
@@ -14,8 +15,11 @@ model_prefixes = {
     'iPhone 15': ['iphone_15_2024-']
 }
 
-def generate_descriptive_stats(data):
-    descriptives = data.groupby('Series')['listing_price'].describe()
+# Exact quartiles keep every price of a series in memory; with exact = False the table streams with
+# Welford moments and quantile sketches (quartiles within 0.5%) and sketched outlier fences instead
+exact = True
+
+def generate_descriptive_stats(descriptives):
     descriptives['cv'] = descriptives['std'] / descriptives['mean']  # Coefficient of variation
     
     # Apply formatting
@@ -32,8 +36,9 @@ def generate_descriptive_stats(data):
     return descriptives
 
 def main():
-    combined_data = get_combined_clean_data(directory, model_prefixes)
-    descriptives = generate_descriptive_stats(combined_data)
+    # One pass over the cleaned listings, a snapshot file at a time
+    listings = iter_clean_listings(directory, model_prefixes, columns=['listing_price'], sketched=not exact)
+    descriptives = generate_descriptive_stats(stream_descriptives(listings, by='Series', exact=exact))
     print(descriptives)
 
 if __name__ == "__main__":
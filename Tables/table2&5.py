@@ -1,7 +1,6 @@
 import pandas as pd
 import os
-from datetime import timedelta
-from dataclean import get_combined_clean_data
+from dataclean import get_combined_clean_data, calculate_rolled_prices, model_codes, select_models
 import numpy as np
 
 # Set the directory
@@ -13,7 +12,7 @@ model_prefixes = {
     'iPhone 8 Plus': 'iphone_8_2024-',
     'iPhone X': 'iphone_X_2024-',
     'iPhone Xr': 'iphone_Xr_2024-',
-    'iPhone Xs Max': 'iphone_X_2024-',
+    'iPhone Xs Max': 'iphone_Xs_2024-',
     'iPhone 11': 'iphone_11_2024-',
     'iPhone 11 Pro': 'iphone_11_2024-',
     'iPhone 11 Pro Max': 'iphone_11_2024-',
@@ -36,31 +35,10 @@ model_prefixes = {
 }
 
 def load_data(directory, model_prefixes):
-    combined_data = get_combined_clean_data(directory, model_prefixes)
+    combined_data = get_combined_clean_data(directory, model_prefixes, columns=['date', 'Model', 'listing_price'])
     combined_data.rename(columns={'date': 'Date'}, inplace=True)
     return combined_data
 
-def calculate_rolled_prices(data, unique_dates, rollback_days):
-    rolled_prices = []
-    for current_date in unique_dates:
-        count = 0
-        date_list = []
-        temp_date = current_date
-
-        while count < rollback_days and temp_date >= unique_dates.min():
-            if temp_date in unique_dates.values:
-                date_list.append(temp_date)
-                count += 1
-            temp_date -= timedelta(days=1)
-
-        if len(date_list) == rollback_days:
-            relevant_data = data[data['Date'].isin(date_list)]
-            if not relevant_data.empty:
-                avg_price = relevant_data['listing_price'].mean()
-                rolled_prices.append({'Date': current_date, 'Rolled Price': avg_price})
-
-    return pd.DataFrame(rolled_prices)
-
 # Load and prepare data
 data = load_data(directory, model_prefixes)
 data = data.dropna(subset=['listing_price'])
@@ -80,20 +58,20 @@ results_1_day = {}
 results_7_days = {}
 std_devs = []
 
+# Registry code per listing, so each model below is selected by an integer comparison
+codes = model_codes(data['Model'])
+
 for model in models:
-    model_data = data[data['Model'].str.contains(model, case=False, na=False)]
+    model_data = select_models(data, model, codes=codes)
     model_data = model_data.sort_values('Date')
     
-    # Get unique dates sorted
-    unique_dates = model_data['Date'].drop_duplicates().sort_values()
-    
     # Calculate for 1-day window
-    rolled_data_1_day = calculate_rolled_prices(model_data, unique_dates, 1)
+    rolled_data_1_day = calculate_rolled_prices(model_data, 1)
     results_1_day[model] = rolled_data_1_day
     std_dev_1_day = rolled_data_1_day['Rolled Price'].std() if not rolled_data_1_day.empty else np.nan
     
     # Calculate for 7-day window
-    rolled_data_7_days = calculate_rolled_prices(model_data, unique_dates, 7)
+    rolled_data_7_days = calculate_rolled_prices(model_data, 7)
     results_7_days[model] = rolled_data_7_days
     std_dev_7_days = rolled_data_7_days['Rolled Price'].std() if not rolled_data_7_days.empty else np.nan
     
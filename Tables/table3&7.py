@@ -1,8 +1,7 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
-from datetime import timedelta
-from dataclean import get_combined_clean_data
+from dataclean import get_combined_clean_data, rolled_price_panel, summarise_rolled_prices
 import numpy as np
 import matplotlib.dates as mdates
 
@@ -15,7 +14,7 @@ model_prefixes = {
     'iPhone 8 Plus': 'iphone_8_2024-',
     'iPhone X': 'iphone_X_2024-',
     'iPhone Xr': 'iphone_Xr_2024-',
-    'iPhone Xs Max': 'iphone_X_2024-',
+    'iPhone Xs Max': 'iphone_Xs_2024-',
     'iPhone 11': 'iphone_11_2024-',
     'iPhone 11 Pro': 'iphone_11_2024-',
     'iPhone 11 Pro Max': 'iphone_11_2024-',
@@ -38,31 +37,10 @@ model_prefixes = {
 }
 
 def load_data(directory, model_prefixes):
-    combined_data = get_combined_clean_data(directory, model_prefixes)
+    combined_data = get_combined_clean_data(directory, model_prefixes, columns=['date', 'Model', 'listing_price'])
     combined_data.rename(columns={'date': 'Date'}, inplace=True)
     return combined_data
 
-def calculate_rolled_prices(data, unique_dates, rollback_days):
-    rolled_prices = []
-    for current_date in unique_dates:
-        count = 0
-        date_list = []
-        temp_date = current_date
-
-        while count < rollback_days and temp_date >= unique_dates.min():
-            if temp_date in unique_dates.values:
-                date_list.append(temp_date)
-                count += 1
-            temp_date -= timedelta(days=1)
-
-        if len(date_list) == rollback_days:
-            relevant_data = data[data['Date'].isin(date_list)]
-            if not relevant_data.empty:
-                avg_price = relevant_data['listing_price'].mean()
-                rolled_prices.append({'Date': current_date, 'Rolled Price': avg_price})
-
-    return pd.DataFrame(rolled_prices)
-
 # Set a specific value for rollback days
 rollback_days = 7
 
@@ -80,39 +58,10 @@ models = [
     'iPhone 15', 'iPhone 15 Plus', 'iPhone 15 Pro', 'iPhone 15 Pro Max'
 ]
 
-# Initialize variables for storing results
-results = []
-ratios = []
-
-for model in models:
-    model_data = data[data['Model'].str.contains(model, case=False, na=False)]
-    model_data = model_data.sort_values('Date')
-    rolled_prices = []
-
-    # Get unique dates sorted
-    unique_dates = model_data['Date'].drop_duplicates().sort_values()
-
-    rolled_data = calculate_rolled_prices(model_data, unique_dates, rollback_days)
-    results.append(rolled_data)
-
-    if not rolled_data.empty:
-        first_price = rolled_data['Rolled Price'].iloc[0]
-        last_price = rolled_data['Rolled Price'].iloc[-1]
-        difference = last_price - first_price
-        ratio = round(last_price / first_price, 3) if first_price != 0 else np.nan
-        std_dev = rolled_data['Rolled Price'].std()
-        
-        ratios.append({
-            'Model': model, 
-            'First Price': first_price, 
-            'Last Price': last_price, 
-            'Difference': difference, 
-            'Ratio': ratio,
-            'Standard Deviation': std_dev
-        })
-
-# Create a DataFrame for the results
-ratios_df = pd.DataFrame(ratios)
+# Rolled prices of every model in one panel, then the first/last price summary per model in the table's order
+panel = rolled_price_panel(data, rollback_days, by='Model')
+summary = summarise_rolled_prices(panel, by='Model')
+ratios_df = summary.reindex([model for model in models if model in summary.index]).rename_axis('Model').reset_index()
 
 # Calculate averages before rounding
 averages = ratios_df.mean(numeric_only=True)
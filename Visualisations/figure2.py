@@ -1,8 +1,7 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
-from datetime import timedelta
-from dataclean import get_combined_clean_data
+from dataclean import get_combined_clean_data, rolled_price_windows
 import numpy as np
 import matplotlib.dates as mdates
 
@@ -14,8 +13,8 @@ model_prefixes = {
     'iPhone 8': 'iphone_8_2024-',
     'iPhone 8 Plus': 'iphone_8_2024-',
     'iPhone X': 'iphone_X_2024-',
-    'iPhone Xs': 'iphone_X_2024-',
-    'iPhone Xs Max': 'iphone_X_2024-',
+    'iPhone Xs': 'iphone_Xs_2024-',
+    'iPhone Xs Max': 'iphone_Xs_2024-',
     'iPhone 11': 'iphone_11_2024-',
     'iPhone 11 Pro': 'iphone_11_2024-',
     'iPhone 11 Pro Max': 'iphone_11_2024-',
@@ -38,31 +37,10 @@ model_prefixes = {
 }
 
 def load_data(directory, model_prefixes):
-    combined_data = get_combined_clean_data(directory, model_prefixes)
+    combined_data = get_combined_clean_data(directory, model_prefixes, columns=['date', 'Model', 'listing_price'])
     combined_data.rename(columns={'date': 'Date'}, inplace=True)
     return combined_data
 
-def calculate_rolled_prices(data, unique_dates, rollback_days):
-    rolled_prices = []
-    for current_date in unique_dates:
-        count = 0
-        date_list = []
-        temp_date = current_date
-
-        while count < rollback_days and temp_date >= unique_dates.min():
-            if temp_date in unique_dates.values:
-                date_list.append(temp_date)
-                count += 1
-            temp_date -= timedelta(days=1)
-
-        if len(date_list) == rollback_days:
-            relevant_data = data[data['Date'].isin(date_list)]
-            if not relevant_data.empty:
-                avg_price = relevant_data['listing_price'].mean()
-                rolled_prices.append({'Date': current_date, 'Rolled Price': avg_price})
-
-    return pd.DataFrame(rolled_prices)
-
 # Load and prepare data
 data = load_data(directory, model_prefixes)
 
@@ -85,38 +63,22 @@ models = [
     'iPhone 15', 'iPhone 15 Plus', 'iPhone 15 Pro', 'iPhone 15 Pro Max'
 ]
 
-# Initialize variables for storing results
-results = {}
-std_devs_by_days = {}
-
 # Rollback days range
 rollback_days_range = range(1, 15)
 
-# For storing std devs for moving window 1 and 7 days
-std_devs_window_1 = {}
-std_devs_window_7 = {}
+# Every window size for every model in one pass over shared per-date sums
+windows = rolled_price_windows(data, models, rollback_days_range)
+results = {model: windows['rolled'][rollback_days_range[-1]][model] for model in models}
 
+# Standard deviations of the models with at least one rolled price, per window size
+std_devs_by_days = {}
 for rollback_days in rollback_days_range:
-    std_devs = []
-    for model in models:
-        model_data = data[data['Model'].str.contains(model, case=False, na=False)]
-        model_data = model_data.sort_values('Date')
-        rolled_prices = []
-
-        # Get unique dates sorted
-        unique_dates = model_data['Date'].drop_duplicates().sort_values()
-
-        rolled_data = calculate_rolled_prices(model_data, unique_dates, rollback_days)
-        results[model] = rolled_data
-
-        if not rolled_data.empty:
-            std_dev = rolled_data['Rolled Price'].std()
-            std_devs.append(std_dev)
-            if rollback_days == 1:
-                std_devs_window_1[model] = std_dev
-            if rollback_days == 7:
-                std_devs_window_7[model] = std_dev
-    std_devs_by_days[rollback_days] = std_devs
+    available = windows['periods'][rollback_days] > 0
+    std_devs_by_days[rollback_days] = windows['std'].loc[available, rollback_days].tolist()
+
+# For storing std devs for moving window 1 and 7 days
+std_devs_window_1 = windows['std'].loc[windows['periods'][1] > 0, 1].to_dict()
+std_devs_window_7 = windows['std'].loc[windows['periods'][7] > 0, 7].to_dict()
 
 # Create a DataFrame for the boxplot
 std_devs_df = pd.DataFrame(std_devs_by_days)
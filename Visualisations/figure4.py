@@ -1,8 +1,8 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
-from datetime import timedelta
-from dataclean import get_combined_clean_data
+from dataclean import get_combined_clean_data, model_codes, select_models
+from bootstrapbands import bootstrap_rolled_prices
 import numpy as np
 import matplotlib.dates as mdates
 
@@ -10,16 +10,14 @@ import matplotlib.dates as mdates
 directory = r'C:\Users\nicop\anaconda3\Scraping\mpscraper\ScrapeFiles'
 rollback_days = 7
 
-# Define model prefixes for iPhone 12 models
+# All four iPhone 12 models come from the same snapshot files, so they are loaded as one series;
+# a series per model would return every listing four times and the bootstrap would resample the copies
 model_prefixes = {
-    'iPhone 12': 'iphone_12_2024-',
-    'iPhone 12 Pro': 'iphone_12_2024-',
-    'iPhone 12 Mini': 'iphone_12_2024-',
-    'iPhone 12 Pro Max': 'iphone_12_2024-'
+    'iPhone 12': 'iphone_12_2024-'
 }
 
 def load_data(directory, model_prefixes):
-    combined_data = get_combined_clean_data(directory, model_prefixes)
+    combined_data = get_combined_clean_data(directory, model_prefixes, columns=['date', 'Model', 'listing_price'])
     combined_data.rename(columns={'date': 'Date'}, inplace=True)
     return combined_data
 
@@ -32,38 +30,18 @@ models = ['iPhone 12', 'iPhone 12 Pro', 'iPhone 12 Mini', 'iPhone 12 Pro Max']
 results = {}
 colors = ['orange', 'green', 'red', 'cyan']
 
+# Registry code per listing, so each model below is selected by an integer comparison
+codes = model_codes(data['Model'])
+
 for model, color in zip(models, colors):
-    model_data = data[data['Model'].str.contains(model, case=False, na=False)]
+    model_data = select_models(data, model, codes=codes)
     model_data = model_data.sort_values('Date')
     
     if model == 'iPhone 12':
         model_data = model_data[model_data['Date'] > model_data['Date'].min()]
 
-    rolled_prices = []
-
-    # Get unique dates sorted
-    unique_dates = model_data['Date'].drop_duplicates().sort_values()
-
-    for current_date in unique_dates:
-        count = 0
-        date_list = []
-        temp_date = current_date
-
-        # Collect enough dates
-        while count < rollback_days and temp_date >= unique_dates.min():
-            if temp_date in unique_dates.values:
-                date_list.append(temp_date)
-                count += 1
-            temp_date -= timedelta(days=1)
-
-        # Only add data if we have complete data for the specified rollback period
-        if len(date_list) == rollback_days:
-            relevant_data = model_data[model_data['Date'].isin(date_list)]
-            if not relevant_data.empty:
-                avg_price = relevant_data['listing_price'].mean()
-                rolled_prices.append({'Date': current_date, 'Rolled Price': avg_price})
-
-    results[model] = pd.DataFrame(rolled_prices)
+    # Rolled prices with 95% bootstrap bands, so thin days show their sampling noise
+    results[model] = bootstrap_rolled_prices(model_data, rollback_days)
 
 # Set font sizes for the plot
 plt.rcParams.update({
@@ -82,6 +60,7 @@ for model, color in zip(models, colors):
     df = results[model]
     if not df.empty:
         plt.plot(df['Date'], df['Rolled Price'], label=model, color=color)
+        plt.fill_between(df['Date'], df['Lower Band'], df['Upper Band'], color=color, alpha=0.2)
         
         # Fit and plot a linear regression trend line
         x = mdates.date2num(df['Date'])
@@ -1,9 +1,9 @@
 import pandas as pd
 import numpy as np
+import os
 import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
-from sklearn.metrics import mean_absolute_error
-from dataclean import get_combined_clean_data
+from pricepivot import load_price_pivot
+from arimagrid import grid_search, best_orders, split_series
 
 # Set the directory and model prefixes
 directory = r'C:\Users\nicop\anaconda3\Scraping\mpscraper\ScrapeFiles'
@@ -17,6 +17,14 @@ model_prefixes = {
     'iPhone 15': ['iphone_15_2024-']
 }
 
+# The ARIMA fits run in parallel; a fit still running after timeout seconds is dropped from the grid.
+# Fitted models are kept in cache_directory, so re-running skips every fit whose inputs are unchanged,
+# and the price pivot in pivot_cache_directory.
+workers = os.cpu_count()
+timeout = 300
+cache_directory = os.path.join(os.path.dirname(directory), 'ArimaCache')
+pivot_cache_directory = os.path.join(os.path.dirname(directory), 'PivotCache')
+
 output_directory = r'C:\Users\nicop\Desktop\Thesis\Fotos'
 
 def save_plot(fig, filename):
@@ -24,24 +32,8 @@ def save_plot(fig, filename):
     plt.close(fig)
 
 def main():
-    # Load and clean the data
-    combined_data = get_combined_clean_data(directory, model_prefixes)
-    
-    # Ensure consistent casing for model names
-    combined_data['Model'] = combined_data['Model'].str.replace('mini', 'Mini', case=False)
-    combined_data['Model'] = combined_data['Model'].str.replace('xr', 'Xr', case=False)
-    
-    # Ensure 'date' is the index and properly sorted
-    combined_data['date'] = pd.to_datetime(combined_data['date'])
-    combined_data.sort_values(by='date', inplace=True)
-    
-    # Group by date and model, then take the mean to remove duplicates
-    numeric_data = combined_data.groupby(['date', 'Model']).agg({'listing_price': 'mean'}).reset_index()
-    
-    # Pivot the data to have models as columns
-    df_pivot = numeric_data.pivot(index='date', columns='Model', values='listing_price')
-    df_pivot = df_pivot.asfreq('D')  # Ensure the date index has a daily frequency
-    df_pivot.fillna(method='ffill', inplace=True)  # Forward fill missing values
+    # Daily mean price per model, forward filled over days without listings
+    df_pivot = load_price_pivot(directory, model_prefixes, cache_directory=pivot_cache_directory)
     
     # Debugging step: print the first few rows of the pivot table
     print("Pivot Table (First few rows):")
@@ -50,49 +42,21 @@ def main():
     # Check the number of observations
     print(f"Number of observations: {len(df_pivot)}")
     
-    # Prepare the results storage
-    results = []
+    # Grid search for ARIMA parameters, every (model, order) fit at once
+    search = grid_search(df_pivot, timeout=timeout, workers=workers, cache_directory=cache_directory)
+    results = best_orders(search['results'])
     all_residuals = []
 
     # Rolling forecast evaluation for each model
-    for column in df_pivot.columns:
-        train_size = int(len(df_pivot[column]) * 0.6)
-        train, test = df_pivot[column].iloc[:train_size], df_pivot[column].iloc[train_size:]
-
-        best_mae = float('inf')
-        best_order = None
-        best_model = None
-
-        # Grid search for ARIMA parameters
-        for p in range(1, 3):
-            for d in range(1, 3):
-                for q in range(7, 10):
-                    try:
-                        model = ARIMA(train, order=(p, d, q))
-                        model_fit = model.fit()
-                        predictions = model_fit.forecast(steps=len(test))
-                        mae = mean_absolute_error(test, predictions)
-                        if mae < best_mae:
-                            best_mae = mae
-                            best_order = (p, d, q)
-                            best_model = model_fit
-                    except:
-                        continue
-
-        mean_actual = test.mean()
-        sMAE = best_mae / mean_actual
+    for column, best_order, best_mae, sMAE in results[['Model', 'Best Order', 'MAE', 'sMAE']].itertuples(index=False, name=None):
+        train, test = split_series(df_pivot[column])
 
         print(f'Best ARIMA order for {column}: {best_order} with MAE: {best_mae} and sMAE: {sMAE}')
+        if best_order is None:
+            continue
 
-        # Store results
-        results.append({
-            'Model': column,
-            'Best Order': best_order,
-            'MAE': best_mae,
-            'sMAE': sMAE
-        })
-
-        # Store residuals with the correct dates
+        # Store residuals of the best order's forecast with the correct dates
+        predictions = search['forecasts'][column][best_order]
         residuals = pd.Series(test.values - predictions, index=test.index)
         all_residuals.append(residuals)
 
@@ -1,8 +1,9 @@
 import pandas as pd
 import numpy as np
+import os
 import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
-from dataclean import get_combined_clean_data
+from pricepivot import load_price_pivot
+from arimacache import fit_cached
 
 # Set the directory and model prefixes
 directory = r'C:\Users\nicop\anaconda3\Scraping\mpscraper\ScrapeFiles'
@@ -10,6 +11,10 @@ model_prefixes = {
     'iPhone 12': ['iphone_12_2024-']
 }
 
+# Fitted ARIMA models and the price pivot are kept here, so unchanged inputs are not recomputed
+cache_directory = os.path.join(os.path.dirname(directory), 'ArimaCache')
+pivot_cache_directory = os.path.join(os.path.dirname(directory), 'PivotCache')
+
 output_directory = r'C:\Users\nicop\Desktop\Thesis\Fotos'
 
 def save_plot(fig, filename):
@@ -17,24 +22,8 @@ def save_plot(fig, filename):
     plt.close(fig)
 
 def main():
-    # Load and clean the data
-    combined_data = get_combined_clean_data(directory, model_prefixes)
-    
-    # Ensure consistent casing for model names
-    combined_data['Model'] = combined_data['Model'].str.replace('mini', 'Mini', case=False)
-    combined_data['Model'] = combined_data['Model'].str.replace('xr', 'Xr', case=False)
-    
-    # Ensure 'date' is the index and properly sorted
-    combined_data['date'] = pd.to_datetime(combined_data['date'])
-    combined_data.sort_values(by='date', inplace=True)
-    
-    # Group by date and model, then take the mean to remove duplicates
-    numeric_data = combined_data.groupby(['date', 'Model']).agg({'listing_price': 'mean'}).reset_index()
-    
-    # Pivot the data to have models as columns
-    df_pivot = numeric_data.pivot(index='date', columns='Model', values='listing_price')
-    df_pivot = df_pivot.asfreq('D')  # Ensure the date index has a daily frequency
-    df_pivot.ffill(inplace=True)  # Forward fill missing values
+    # Daily mean price per model, forward filled over days without listings
+    df_pivot = load_price_pivot(directory, model_prefixes, cache_directory=pivot_cache_directory)
     
     # Debugging step: print the first few rows of the pivot table
     print("Pivot Table (First few rows):")
@@ -51,13 +40,10 @@ def main():
         print("Not enough observations to fit the ARIMA model reliably.")
         return
 
-    # Fit ARIMA model with parameters (1, 1, 7)
-    model = ARIMA(model_data, order=(1, 1, 7))
-    model_fit = model.fit()
-    
-    # Forecast for the next 2 months (approximately 60 days)
+    # Fit ARIMA model with parameters (1, 1, 7) and forecast the next 2 months (approximately 60 days)
     forecast_steps = 60
-    forecast = model_fit.forecast(steps=forecast_steps)
+    model_fit = fit_cached(model_data, (1, 1, 7), forecast_steps, cache_directory)
+    forecast = model_fit['forecasts'][forecast_steps]
     
     # Generate dates for the forecast
     last_date = model_data.index[-1]
@@ -0,0 +1,96 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import hashlib
+import statsmodels
+from statsmodels.tsa.arima.model import ARIMA
+from cleancache import load_cached, store_cached, ENTRY_SUFFIX, MAX_BYTES
+
+# Fitted ARIMA models on disk, addressed by a hash of the training series (dates and prices), the order
+# and the model options. An entry holds the estimated parameters, the final predicted state and its
+# covariance, and the forecasts asked for so far; the full results object is rebuilt from the parameters
+# with one Kalman filter pass, without optimising again. Storage and LRU eviction are cleancache's.
+CACHE_VERSION = 1
+WARM_START_DAYS = 7
+
+def series_fingerprint(series):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else series.index.to_numpy()).tobytes())
+    digest.update(np.ascontiguousarray(series.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+def fit_key(train, order, options=None):
+    description = {
+        'version': CACHE_VERSION,
+        'statsmodels': statsmodels.__version__,
+        'series': series_fingerprint(train),
+        'freq': getattr(train.index, 'freqstr', None),
+        'order': list(order),
+        'options': options or {}
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def fit_entry(train, order, steps=(), options=None, start_params=None, callback=None):
+    # Fit from scratch (or from start_params) and keep what is needed to forecast again later
+    start = time.perf_counter()
+    model = ARIMA(train, order=order, **(options or {}))
+    model_fit = model.fit(start_params=start_params, method_kwargs={'callback': callback} if callback is not None else None)
+    return {
+        'order': tuple(order),
+        'params': model_fit.params,
+        'converged': bool(model_fit.mle_retvals.get('converged', False)),
+        'llf': model_fit.llf,
+        'nobs': int(model_fit.nobs),
+        'state': model_fit.predicted_state[:, -1],
+        'state_cov': model_fit.predicted_state_cov[:, :, -1],
+        'forecasts': {int(step): model_fit.forecast(steps=int(step)) for step in steps},
+        'warm_start': start_params is not None,
+        'seconds': time.perf_counter() - start
+    }
+
+def entry_results(train, entry, options=None):
+    # The results object of a cached fit, for anything beyond the stored forecasts
+    return ARIMA(train, order=entry['order'], **(options or {})).filter(entry['params'])
+
+def entry_forecast(train, entry, steps, options=None):
+    forecast = entry['forecasts'].get(int(steps))
+    if forecast is None:
+        forecast = entry_results(train, entry, options).forecast(steps=int(steps))
+        entry['forecasts'][int(steps)] = forecast
+    return forecast
+
+def load_fit(cache_directory, train, order, options=None):
+    return load_cached(cache_directory, fit_key(train, order, options))
+
+def store_fit(cache_directory, train, entry, options=None, max_bytes=MAX_BYTES):
+    store_cached(cache_directory, fit_key(train, entry['order'], options), entry, max_bytes=max_bytes)
+
+def warm_start_params(cache_directory, train, order, options=None, days=WARM_START_DAYS):
+    # Parameters of the same order fitted on this series up to one to `days` days shorter, the longest first
+    for length in range(len(train) - 1, max(len(train) - days, 1) - 1, -1):
+        key = fit_key(train.iloc[:length], order, options)
+        if os.path.exists(os.path.join(cache_directory, key + ENTRY_SUFFIX)):
+            return load_cached(cache_directory, key)['params']
+    return None
+
+def fit_cached(train, order, steps=(), cache_directory=None, options=None, warm_start_days=0, callback=None, max_bytes=MAX_BYTES):
+    # The cached entry when the training series, order and options are unchanged, otherwise a new fit
+    # (warm-started from a shorter cached series when warm_start_days > 0) that is stored for next time
+    steps = [steps] if isinstance(steps, int) else list(steps)
+    if cache_directory is None:
+        return fit_entry(train, order, steps, options, callback=callback)
+    os.makedirs(cache_directory, exist_ok=True)
+    entry = load_fit(cache_directory, train, order, options)
+    if entry is not None:
+        missing = [step for step in steps if int(step) not in entry['forecasts']]
+        for step in missing:
+            entry_forecast(train, entry, step, options)
+        if missing:
+            store_fit(cache_directory, train, entry, options, max_bytes)
+        return entry
+    start_params = warm_start_params(cache_directory, train, order, options, warm_start_days) if warm_start_days else None
+    entry = fit_entry(train, order, steps, options, start_params, callback)
+    store_fit(cache_directory, train, entry, options, max_bytes)
+    return entry
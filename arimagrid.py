@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import mean_absolute_error
+from arimacache import fit_entry, entry_forecast, load_fit, store_fit, warm_start_params
+from cleancache import MAX_BYTES
+
+# ARIMA order grid search over every column of a daily price pivot. Each (series, order) pair is one
+# task, so the fits of all series share one process pool. A fit that runs past its timeout is stopped at
+# its next optimizer iteration (no process is killed, so this also works on Windows). Results come back in
+# submission order and ties keep the first order of the grid, so the table does not depend on the workers.
+ORDERS = [(p, d, q) for p in range(1, 3) for d in range(1, 3) for q in range(7, 10)]
+RESULT_COLUMNS = ['Model', 'Order', 'Status', 'Converged', 'MAE', 'sMAE', 'Standardized MAE', 'Cached', 'Seconds']
+
+class FitTimeout(Exception):
+    pass
+
+def split_series(series, train_fraction=0.6):
+    train_size = int(len(series) * train_fraction)
+    return series.iloc[:train_size], series.iloc[train_size:]
+
+def _new_result(order):
+    return {'Order': order, 'Status': 'ok', 'Converged': False, 'MAE': np.nan, 'sMAE': np.nan, 'Standardized MAE': np.nan,
+            'Cached': False, 'Forecast': None, 'Entry': None}
+
+def _score(result, train, test, entry):
+    predictions = entry_forecast(train, entry, len(test))
+    mae = mean_absolute_error(test, predictions)
+    result.update({'Converged': entry['converged'], 'MAE': mae, 'sMAE': mae / test.mean(), 'Standardized MAE': mae / (test.max() - test.min()),
+                   'Forecast': predictions})
+
+def fit_order(train, test, order, timeout=None, start_params=None):
+    # One fit and its forecast over the test period; errors are reported instead of raised
+    start = time.perf_counter()
+    deadline = start + timeout if timeout is not None else None
+
+    def check_deadline(params):
+        if time.perf_counter() > deadline:
+            raise FitTimeout()
+
+    result = _new_result(order)
+    try:
+        # Convergence is reported in the table rather than warned about from every worker
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            result['Entry'] = fit_entry(train, order, [len(test)], start_params=start_params, callback=check_deadline if deadline is not None else None)
+        _score(result, train, test, result['Entry'])
+    except FitTimeout:
+        result['Status'] = 'timeout'
+    except Exception as error:
+        result['Status'] = f'failed: {error}'
+    result['Seconds'] = time.perf_counter() - start
+    return result
+
+def _cached_order(train, test, order, entry):
+    start = time.perf_counter()
+    result = _new_result(order)
+    result['Cached'] = True
+    try:
+        _score(result, train, test, entry)
+    except Exception as error:
+        result['Status'] = f'failed: {error}'
+    result['Seconds'] = time.perf_counter() - start
+    return result
+
+def grid_search(pivot, orders=ORDERS, train_fraction=0.6, timeout=None, workers=None, cache_directory=None, warm_start_days=0, max_bytes=MAX_BYTES):
+    # Every order for every column of the pivot. Returns {'results': one row per (model, order) fit,
+    # 'forecasts': {model: {order: test period forecast}}}; failed and timed out fits have a NaN MAE.
+    # With a cache_directory, fits whose training series, order and options are unchanged come from the
+    # arimacache instead of being refitted, and new fits can warm-start from a series up to warm_start_days
+    # shorter. Only this process touches the cache; the workers just fit.
+    tasks = []
+    for column in pivot.columns:
+        train, test = split_series(pivot[column], train_fraction)
+        tasks.extend((column, train, test, tuple(order)) for order in orders)
+    caching = cache_directory is not None
+    if caching:
+        os.makedirs(cache_directory, exist_ok=True)
+    fits = [None] * len(tasks)
+    pending = []
+    for position, (_, train, test, order) in enumerate(tasks):
+        entry = load_fit(cache_directory, train, order) if caching else None
+        if entry is not None:
+            fits[position] = _cached_order(train, test, order, entry)
+            continue
+        start_params = warm_start_params(cache_directory, train, order, days=warm_start_days) if caching and warm_start_days else None
+        pending.append((position, (train, test, order, timeout, start_params)))
+
+    if workers is None or workers <= 1:
+        for position, arguments in pending:
+            fits[position] = fit_order(*arguments)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(position, executor.submit(fit_order, *arguments)) for position, arguments in pending]
+            for position, future in futures:
+                fits[position] = future.result()
+
+    forecasts = {}
+    for (column, train, _, order), fit in zip(tasks, fits):
+        fit['Model'] = column
+        forecasts.setdefault(column, {})[order] = fit.pop('Forecast')
+        entry = fit.pop('Entry')
+        if caching and entry is not None:
+            store_fit(cache_directory, train, entry, max_bytes=max_bytes)
+    results = pd.DataFrame(fits, columns=RESULT_COLUMNS)
+    return {'results': results, 'forecasts': forecasts}
+
+def best_orders(results):
+    # The lowest MAE order per model, the first in grid order on ties; models without a successful fit get no order
+    rows = []
+    for model, fits in results.groupby('Model', sort=False):
+        fitted = fits.dropna(subset=['MAE'])
+        if len(fitted) == 0:
+            rows.append({'Model': model, 'Best Order': None, 'MAE': np.nan, 'sMAE': np.nan, 'Standardized MAE': np.nan})
+            continue
+        best = fitted.loc[fitted['MAE'].idxmin()]
+        rows.append({'Model': model, 'Best Order': best['Order'], 'MAE': best['MAE'], 'sMAE': best['sMAE'], 'Standardized MAE': best['Standardized MAE']})
+    return pd.DataFrame(rows, columns=['Model', 'Best Order', 'MAE', 'sMAE', 'Standardized MAE'])
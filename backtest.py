@@ -0,0 +1,105 @@
+import pandas as pd
+import numpy as np
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.arima.model import ARIMA
+from arimacache import fit_entry, load_fit, store_fit
+from arimagrid import split_series
+from cleancache import MAX_BYTES
+
+# Rolling-origin (walk-forward) evaluation of ARIMA forecasts. The model is fitted once on the training
+# part of a series; after that its parameters stay fixed and the state-space model just absorbs one more
+# observation per origin. That is one Kalman filter pass over the whole series, which gives the predicted
+# state at every origin, and the h-step forecasts of all origins are then propagated from those states
+# together. The forecasts equal chaining results.extend() one day at a time, without rebuilding the model
+# for every origin.
+HORIZONS = [1, 7]
+ERROR_COLUMNS = ['Model', 'Order', 'Horizon', 'Origins', 'MAE', 'sMAE', 'Standardized MAE']
+
+def origin_forecasts(series, order, params, first_origin, horizons=HORIZONS):
+    # Forecasts of series[t + h - 1] made with the data before position t, for every t from first_origin on
+    model_fit = ARIMA(series, order=order).filter(params)
+    filtered = model_fit.filter_results
+    matrices = [filtered.design, filtered.obs_intercept, filtered.transition, filtered.state_intercept]
+    if any(matrix.shape[-1] > 1 for matrix in matrices):
+        raise ValueError("Walk-forward forecasts need a time-invariant state-space model")
+    design, obs_intercept, transition, state_intercept = [matrix[..., 0] for matrix in matrices]
+    # Column t of predicted_state is the state predicted from the observations before position t
+    states = filtered.predicted_state[:, first_origin:len(series)]
+    origins = np.arange(first_origin, len(series))
+    index = series.index
+    rows = []
+    for horizon in range(1, max(horizons) + 1):
+        if horizon in horizons:
+            targets = origins + horizon - 1
+            inside = targets < len(series)
+            rows.append(pd.DataFrame({
+                'Origin': index[origins[inside] - 1],
+                'Horizon': horizon,
+                'Date': index[targets[inside]],
+                'Forecast': (design @ states[:, inside] + obs_intercept[:, None])[0],
+                'Actual': series.to_numpy()[targets[inside]]
+            }))
+        states = transition @ states + state_intercept[:, None]
+    return pd.concat(rows, ignore_index=True)
+
+def walk_forward(series, order, horizons=HORIZONS, train_fraction=0.6, entry=None):
+    # Fit on the training part (unless a fitted entry is given) and forecast from every later origin.
+    # Returns (forecasts, entry, status); errors are reported instead of raised.
+    train, _ = split_series(series, train_fraction)
+    try:
+        if entry is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                entry = fit_entry(train, order)
+        return origin_forecasts(series, order, entry['params'], len(train), horizons), entry, 'ok'
+    except Exception as error:
+        return None, entry, f'failed: {error}'
+
+def backtest(pivot, orders, horizons=HORIZONS, train_fraction=0.6, workers=None, cache_directory=None, max_bytes=MAX_BYTES):
+    # Walk-forward forecasts for every column of the pivot, with one order for all columns or a
+    # {column: order} dict such as the 'Best Order' column of arimagrid.best_orders (columns without an
+    # order are left out). The training fits are shared with arimagrid through the same cache_directory.
+    # Returns {'forecasts': one row per (model, origin, horizon), 'errors': one row per (model, horizon)}.
+    if not isinstance(orders, dict):
+        orders = {column: orders for column in pivot.columns}
+    tasks = [(column, tuple(orders[column])) for column in pivot.columns if orders.get(column) is not None]
+    if cache_directory is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+    entries = [load_fit(cache_directory, split_series(pivot[column], train_fraction)[0], order) if cache_directory is not None else None
+               for column, order in tasks]
+    arguments = [(pivot[column], order, horizons, train_fraction, entry) for (column, order), entry in zip(tasks, entries)]
+    if workers is None or workers <= 1:
+        outcomes = [walk_forward(*series_arguments) for series_arguments in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(walk_forward, *series_arguments) for series_arguments in arguments]
+            outcomes = [future.result() for future in futures]
+
+    forecasts = []
+    errors = []
+    for (column, order), cached, (series_forecasts, entry, status) in zip(tasks, entries, outcomes):
+        if cache_directory is not None and cached is None and entry is not None:
+            store_fit(cache_directory, split_series(pivot[column], train_fraction)[0], entry, max_bytes=max_bytes)
+        if series_forecasts is None:
+            print(f"Walk-forward backtest for {column} {order}: {status}")
+            continue
+        series_forecasts.insert(0, 'Model', column)
+        series_forecasts.insert(1, 'Order', [order] * len(series_forecasts))
+        forecasts.append(series_forecasts)
+        errors.append(horizon_errors(series_forecasts, split_series(pivot[column], train_fraction)[1], column, order))
+    return {'forecasts': pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(),
+            'errors': pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_COLUMNS)}
+
+def horizon_errors(forecasts, test, model, order):
+    # MAE per horizon over every origin with a known actual, scaled like arimagrid's by the test period's mean and range
+    forecasts = forecasts.dropna(subset=['Actual'])
+    absolute = (forecasts['Actual'] - forecasts['Forecast']).abs()
+    table = absolute.groupby(forecasts['Horizon']).agg(['count', 'mean']).reset_index()
+    table.columns = ['Horizon', 'Origins', 'MAE']
+    table.insert(0, 'Model', model)
+    table.insert(1, 'Order', [order] * len(table))
+    table['sMAE'] = table['MAE'] / test.mean()
+    table['Standardized MAE'] = table['MAE'] / (test.max() - test.min())
+    return table[ERROR_COLUMNS]
@@ -0,0 +1,51 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclean import calculate_rolled_prices, model_codes, select_models
+
+# Percentile bootstrap bands around the rolled prices. Each window's listings are resampled with
+# replacement through one (resamples x listings) index matrix, split into chunks of at most MAX_DRAWS
+# draws so a busy window cannot exhaust memory.
+MAX_DRAWS = 4_000_000
+
+def bootstrap_rolled_prices(data, rollback_days, resamples=1000, confidence=0.95, seed=0, date_column='Date', price_column='listing_price'):
+    # calculate_rolled_prices with a 'Lower Band' and 'Upper Band' column: the central confidence interval
+    # of the rolled price over resamples bootstrap resamples of the listings in its window
+    rolled = calculate_rolled_prices(data, rollback_days, date_column, price_column)
+    data = data.dropna(subset=[date_column])
+    if not data[date_column].is_monotonic_increasing:
+        data = data.sort_values(date_column, kind='stable')
+    # With the listings in date order every window is one contiguous slice
+    days = data[date_column].to_numpy()
+    starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]])) if len(days) else np.zeros(0, dtype=np.int64)
+    ends = np.append(starts[1:], len(days))
+    prices = data[price_column].to_numpy(dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2 * 100
+    bands = np.full((len(rolled), 2), np.nan)
+    for row, day in enumerate(range(rollback_days - 1, len(starts))):
+        window = prices[starts[day - rollback_days + 1]:ends[day]]
+        window = window[~np.isnan(window)]
+        if len(window) == 0:
+            continue
+        chunk = max(1, MAX_DRAWS // len(window))
+        means = np.concatenate([window[rng.integers(0, len(window), size=(min(chunk, resamples - done), len(window)))].mean(axis=1)
+                                for done in range(0, resamples, chunk)])
+        bands[row] = np.percentile(means, [tail, 100 - tail])
+    return rolled.assign(**{'Lower Band': bands[:, 0], 'Upper Band': bands[:, 1]})
+
+def bootstrap_models(data, models, rollback_days, resamples=1000, confidence=0.95, seed=0, workers=None, families=False,
+                     date_column='Date', price_column='listing_price', model_column='Model'):
+    # bootstrap_rolled_prices for every model (or family), spread over a process pool when workers > 1.
+    # Every model gets its own seed from one SeedSequence, so the bands do not depend on the number of workers.
+    codes = model_codes(data[model_column])
+    seeds = np.random.SeedSequence(seed).spawn(len(models))
+    subsets = [select_models(data, model, family=families, codes=codes)[[date_column, price_column]] for model in models]
+    arguments = [(subset, rollback_days, resamples, confidence, model_seed, date_column, price_column) for subset, model_seed in zip(subsets, seeds)]
+    if workers is None or workers <= 1:
+        results = [bootstrap_rolled_prices(*model_arguments) for model_arguments in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(bootstrap_rolled_prices, *model_arguments) for model_arguments in arguments]
+            results = [future.result() for future in futures]
+    return dict(zip(models, results))
@@ -0,0 +1,145 @@
+import pandas as pd
+import os
+import json
+import hashlib
+import shutil
+from dataclean import resolve_prefixes, file_sha256, CLEANING_VERSION
+
+# Cleaned datasets on disk, addressed by a hash of everything they were built from: the content of
+# every input file, the series -> prefix mapping and the cleaning parameters. Entries are pickles
+# (fast, and they keep every dtype) or, for data that is memory-mapped, directories of files; the least
+# recently used ones go once the cache outgrows max_bytes.
+CACHE_VERSION = 2
+MAX_BYTES = 2 * 1024 ** 3
+ENTRY_SUFFIX = '.pkl'
+DIRECTORY_SUFFIX = '.dir'
+HASHES_FILENAME = 'hashes.json'
+STATISTICS_FILENAME = 'statistics.json'
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+def _write_json(path, value):
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(value, file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def content_hashes(manifest, filenames, cache_directory):
+    # File hashes are remembered with the size and mtime they were computed for, so unchanged files are not re-read
+    path = os.path.join(cache_directory, HASHES_FILENAME)
+    known = _read_json(path, {})
+    hashes = []
+    changed = False
+    for filename in filenames:
+        snapshot = manifest['snapshots'][filename]
+        file_path = os.path.abspath(os.path.join(manifest['directory'], filename))
+        entry = known.get(file_path)
+        if entry is None or (entry['size'], entry['mtime']) != (snapshot['size'], snapshot['mtime']):
+            entry = {'size': snapshot['size'], 'mtime': snapshot['mtime'], 'sha256': file_sha256(file_path)}
+            known[file_path] = entry
+            changed = True
+        hashes.append([filename, entry['sha256']])
+    if changed:
+        _write_json(path, known)
+    return hashes
+
+def cache_key(manifest, series_prefixes, parameters, cache_directory):
+    os.makedirs(cache_directory, exist_ok=True)
+    filenames = sorted({filename for prefixes in series_prefixes.values() for filename in resolve_prefixes(manifest, prefixes)})
+    description = {
+        'version': CACHE_VERSION,
+        'cleaning': CLEANING_VERSION,  # Entries from before a change to the cleaned output no longer match
+        'files': content_hashes(manifest, filenames, cache_directory),
+        'series_prefixes': {series: [prefixes] if isinstance(prefixes, str) else list(prefixes) for series, prefixes in series_prefixes.items()},
+        'parameters': parameters
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=list).encode('utf-8')).hexdigest()
+
+def _record(cache_directory, event, count=1):
+    path = os.path.join(cache_directory, STATISTICS_FILENAME)
+    statistics = _read_json(path, {'hits': 0, 'misses': 0, 'evictions': 0})
+    statistics[event] += count
+    _write_json(path, statistics)
+
+def load_cached(cache_directory, key):
+    path = os.path.join(cache_directory, key + ENTRY_SUFFIX)
+    if not os.path.exists(path):
+        _record(cache_directory, 'misses')
+        return None
+    os.utime(path)  # The modification time doubles as the last-used time for LRU eviction
+    _record(cache_directory, 'hits')
+    return pd.read_pickle(path)
+
+def store_cached(cache_directory, key, value, max_bytes=MAX_BYTES):
+    # Any picklable value; arimacache keeps fitted models here too
+    path = os.path.join(cache_directory, key + ENTRY_SUFFIX)
+    pd.to_pickle(value, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    evict(cache_directory, max_bytes)
+
+def load_cached_directory(cache_directory, key):
+    # Path of a directory entry, or None when it is missing
+    path = os.path.join(cache_directory, key + DIRECTORY_SUFFIX)
+    if not os.path.isdir(path):
+        _record(cache_directory, 'misses')
+        return None
+    os.utime(path)
+    _record(cache_directory, 'hits')
+    return path
+
+def store_cached_directory(cache_directory, key, write, max_bytes=MAX_BYTES):
+    # write(path) fills a fresh directory, which only becomes the entry once it is complete
+    path = os.path.join(cache_directory, key + DIRECTORY_SUFFIX)
+    shutil.rmtree(path + '.tmp', ignore_errors=True)
+    write(path + '.tmp')
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(path + '.tmp', path)
+    evict(cache_directory, max_bytes)
+    return path
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def cache_entries(cache_directory):
+    entries = []
+    with os.scandir(cache_directory) as scan:
+        for entry in scan:
+            if entry.name.endswith(ENTRY_SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                entries.append({'key': entry.name[:-len(ENTRY_SUFFIX)], 'name': entry.name, 'size': stat.st_size, 'last_used': stat.st_mtime_ns})
+            elif entry.name.endswith(DIRECTORY_SUFFIX) and entry.is_dir():
+                entries.append({'key': entry.name[:-len(DIRECTORY_SUFFIX)], 'name': entry.name, 'size': _directory_size(entry.path),
+                                'last_used': entry.stat().st_mtime_ns})
+    return sorted(entries, key=lambda entry: entry['last_used'])
+
+def evict(cache_directory, max_bytes=MAX_BYTES):
+    entries = cache_entries(cache_directory)
+    total = sum(entry['size'] for entry in entries)
+    evicted = 0
+    # Oldest first, but the entry just written (the most recent) always stays
+    for entry in entries[:-1]:
+        if total <= max_bytes:
+            break
+        path = os.path.join(cache_directory, entry['name'])
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        total -= entry['size']
+        evicted += 1
+    if evicted:
+        _record(cache_directory, 'evictions', evicted)
+    return evicted
+
+def cache_statistics(cache_directory):
+    statistics = _read_json(os.path.join(cache_directory, STATISTICS_FILENAME), {'hits': 0, 'misses': 0, 'evictions': 0})
+    entries = cache_entries(cache_directory) if os.path.isdir(cache_directory) else []
+    statistics['entries'] = len(entries)
+    statistics['bytes'] = sum(entry['size'] for entry in entries)
+    lookups = statistics['hits'] + statistics['misses']
+    statistics['hit_rate'] = statistics['hits'] / lookups if lookups else 0.0
+    return statistics
@@ -1,67 +1,526 @@
 import pandas as pd
+import numpy as np
 import os
+import re
+import bisect
+import hashlib
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from priceparse import parse_euro_prices
 
-def load_and_combine_csv(directory, prefixes):
-    data_frames = []
+# Scraper output is written as iphone_<series>_<YYYY-MM-DD>.csv
+SNAPSHOT_FILENAME = re.compile(r'^iphone_(?P<series>[^_]+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$')
+
+def parse_snapshot_filename(filename):
+    match = SNAPSHOT_FILENAME.match(filename)
+    if match is None:
+        return None
+    return match.group('series'), match.group('date')
+
+# Version of what loading and cleaning produce. Bump it with every change to the cleaned output (parsing,
+# model names, the outlier step), so caches keyed on it never return data cleaned the old way.
+# 2: model names normalised through the registry ('iPhone 13 mini' -> 'iPhone 13 Mini')
+CLEANING_VERSION = 2
+
+# Header names in the scraper output for the columns that are renamed on load
+CSV_COLUMNS = {'date': 'Date', 'listing_price': 'Price'}
+
+# Canonical model names by family; every spelling the scraper produces is normalised to one of these on load
+MODEL_FAMILIES = {
+    'iPhone 8': ['iPhone 8', 'iPhone 8 Plus'],
+    'iPhone X': ['iPhone X', 'iPhone Xr', 'iPhone Xs', 'iPhone Xs Max'],
+    'iPhone 11': ['iPhone 11', 'iPhone 11 Pro', 'iPhone 11 Pro Max'],
+    'iPhone 12': ['iPhone 12', 'iPhone 12 Mini', 'iPhone 12 Pro', 'iPhone 12 Pro Max'],
+    'iPhone 13': ['iPhone 13', 'iPhone 13 Mini', 'iPhone 13 Pro', 'iPhone 13 Pro Max'],
+    'iPhone 14': ['iPhone 14', 'iPhone 14 Plus', 'iPhone 14 Pro', 'iPhone 14 Pro Max'],
+    'iPhone 15': ['iPhone 15', 'iPhone 15 Plus', 'iPhone 15 Pro', 'iPhone 15 Pro Max']
+}
+MODELS = [model for variants in MODEL_FAMILIES.values() for model in variants]
+MODEL_CODES = {model: code for code, model in enumerate(MODELS)}
+_MODEL_SPELLINGS = {model.lower(): model for model in MODELS}
+
+def normalise_models(models):
+    # 'iPhone 13 mini' -> 'iPhone 13 Mini'; names outside the registry are kept as they are.
+    # Only the distinct names are looked up, so this costs one hash pass over the rows.
+    mapping = {name: _MODEL_SPELLINGS.get(name.lower(), name) for name in models.dropna().unique()}
+    return models.map(mapping)
+
+def model_codes(models):
+    # Integer code per row in MODELS order, -1 for missing names and names outside the registry
+    return pd.Categorical(models, categories=MODELS).codes
+
+def variant_codes(name, family=False):
+    # Codes of one exact model, or with family=True of every variant in its family
+    return np.array([MODEL_CODES[model] for model in (MODEL_FAMILIES[name] if family else [name])], dtype=np.int16)
+
+def select_models(data, name, family=False, codes=None):
+    # Rows of an exact model or a whole family; pass codes from model_codes when selecting repeatedly
+    if codes is None:
+        codes = model_codes(data['Model'])
+    return data[np.isin(codes, variant_codes(name, family))]
+
+def read_snapshot_csv(file_path, columns=None):
+    # Only the requested columns are converted, so skipped free text never becomes Python strings
+    usecols = None if columns is None else [CSV_COLUMNS.get(column, column) for column in columns]
+    df = pd.read_csv(file_path, usecols=usecols)
+    df.rename(columns={'Date': 'date', 'Price': 'listing_price'}, inplace=True)
+    if 'listing_price' in df.columns:
+        # Dutch-formatted prices ('€ 1.234,56'); prices that cannot be parsed become NaN instead of raising
+        df['listing_price'], _ = parse_euro_prices(df['listing_price'].to_numpy())
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')  # Ensure date is in datetime format
+    if 'Model' in df.columns:
+        df['Model'] = normalise_models(df['Model'])
+    if columns is not None:
+        df = df[columns]
+    return df
+
+def build_manifest(directory):
+    # One scan of the directory; every CSV is indexed by name with its series, date, size and mtime
+    snapshots = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.csv'):
+                stat = entry.stat()
+                series, date = parse_snapshot_filename(entry.name) or (None, None)
+                snapshots[entry.name] = {'series': series, 'date': date, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    return {'directory': directory, 'filenames': sorted(snapshots), 'snapshots': snapshots}
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def resolve_prefixes(manifest, prefixes):
+    if isinstance(prefixes, str):
+        prefixes = [prefixes]  # A single prefix, not an iterable of characters
+    filenames = manifest['filenames']
+    matched = set()
     for prefix in prefixes:
-        for filename in os.listdir(directory):
-            if filename.startswith(prefix) and filename.endswith('.csv'):
-                file_path = os.path.join(directory, filename)
-                df = pd.read_csv(file_path)
-                df.rename(columns={'Date': 'date', 'Price': 'listing_price'}, inplace=True)
-                # Ensure listing_price is treated as string regardless of its content
-                df['listing_price'] = df['listing_price'].astype(str).str.replace('€', '').str.replace(',', '.').astype(float)
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')  # Ensure date is in datetime format
-                data_frames.append(df)
+        # Filenames sharing a prefix form a contiguous run in the sorted index
+        position = bisect.bisect_left(filenames, prefix)
+        while position < len(filenames) and filenames[position].startswith(prefix):
+            matched.add(filenames[position])
+            position += 1
+    return sorted(matched)
+
+def new_read_cache(manifest, series_prefixes):
+    # Parsed snapshots shared between the series of one call, so each physical file is read once however many
+    # series map to it. A frame is kept only until the last series that needs it has read it, and the cache
+    # goes away with the call, so nothing outlives get_combined_clean_data.
+    uses = Counter(filename for prefixes in series_prefixes.values() for filename in resolve_prefixes(manifest, prefixes))
+    return {'uses': uses, 'frames': {}}
+
+def _read_snapshot_file(directory, filename, snapshot, store_directory=None, columns=None):
+    if store_directory is not None:
+        import snapshotstore  # Only needed (and pyarrow only required) when a store is used
+        if snapshotstore.is_imported(store_directory, filename, snapshot):
+            return snapshotstore.read_snapshot(store_directory, filename, columns=columns)
+    # Fall back to the CSV file for snapshots that have not been imported yet
+    return read_snapshot_csv(os.path.join(directory, filename), columns=columns)
+
+def read_snapshot(manifest, filename, store_directory=None, columns=None, cache=None):
+    if cache is None:
+        return _read_snapshot_file(manifest['directory'], filename, manifest['snapshots'][filename], store_directory=store_directory, columns=columns)
+    cache['uses'][filename] -= 1
+    if filename in cache['frames']:
+        # The last reader takes the frame out of the cache
+        return cache['frames'][filename] if cache['uses'][filename] > 0 else cache['frames'].pop(filename)
+    df = _read_snapshot_file(manifest['directory'], filename, manifest['snapshots'][filename], store_directory=store_directory, columns=columns)
+    if cache['uses'][filename] > 0:
+        cache['frames'][filename] = df
+    return df
+
+def prefetch_snapshots(manifest, filenames, cache, store_directory=None, columns=None, workers=None, max_in_flight=None):
+    # Parse (and normalise) the files that are not in the cache yet across a process pool, into the cache.
+    # Every frame stays in the cache until it is read, so callers bound memory by prefetching one series at a time.
+    # This and every other process pool in the project (bootstrapbands, arimagrid, backtest) re-imports the calling
+    # script in each worker on Windows, so scripts passing workers need an `if __name__ == "__main__":` guard.
+    missing = [filename for filename in filenames if filename not in cache['frames']]
+    if not missing:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    # At most this many files are submitted ahead of the one being collected, so results do not pile up in the pool
+    max_in_flight = max_in_flight or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for filename in missing:
+            if len(pending) >= max_in_flight:
+                filename_done, future = pending.popleft()
+                cache['frames'][filename_done] = future.result()
+            snapshot = manifest['snapshots'][filename]
+            future = executor.submit(_read_snapshot_file, manifest['directory'], filename, snapshot, store_directory, columns)
+            pending.append((filename, future))
+        # Collected in submission (filename) order, so the result does not depend on worker timing
+        while pending:
+            filename_done, future = pending.popleft()
+            cache['frames'][filename_done] = future.result()
+
+def load_and_combine_csv(directory, prefixes, store_directory=None, columns=None, manifest=None, workers=None, cache=None):
+    if manifest is None:
+        manifest = build_manifest(directory)
+    filenames = resolve_prefixes(manifest, prefixes)
+    if workers is not None and workers > 1:
+        if cache is None:
+            cache = new_read_cache(manifest, {None: prefixes})
+        prefetch_snapshots(manifest, filenames, cache, store_directory=store_directory, columns=columns, workers=workers)
+    data_frames = [read_snapshot(manifest, filename, store_directory=store_directory, columns=columns, cache=cache)
+                   for filename in filenames]
     if data_frames:
         combined_data = pd.concat(data_frames, ignore_index=True)
         return combined_data
     else:
         return pd.DataFrame()  # Return an empty DataFrame if no files were found
 
-def remove_outliers(df, column='listing_price', min_listings=10):
+def outlier_bounds(df, column='listing_price', by='Model'):
+    # Size, quartiles and 1.5 x IQR fences per group, indexed by the group keys in sorted order
+    keys = [by] if isinstance(by, str) else list(by)
+    grouped = df.groupby(keys, sort=True, dropna=True)
+    bounds = pd.DataFrame({'count': grouped.size()})
+    if grouped.ngroups > 0:
+        quartiles = grouped[column].quantile([0.25, 0.75]).unstack()
+        bounds['Q1'] = quartiles[0.25]
+        bounds['Q3'] = quartiles[0.75]
+    else:
+        bounds['Q1'] = bounds['Q3'] = np.nan
+    IQR = bounds['Q3'] - bounds['Q1']
+    bounds['lower_bound'] = bounds['Q1'] - 1.5 * IQR
+    bounds['upper_bound'] = bounds['Q3'] + 1.5 * IQR
+    return bounds
+
+def apply_outlier_bounds(df, bounds, column='listing_price', by='Model', min_listings=0):
+    # Keep the listings inside their group's fences with one hash lookup per row; unknown groups are dropped
+    keys = [by] if isinstance(by, str) else list(by)
+    row_keys = pd.MultiIndex.from_frame(df[keys]) if len(keys) > 1 else pd.Index(df[keys[0]])
+    positions = bounds.index.get_indexer(row_keys)
+    found = positions >= 0
+    if not found.any():
+        return df.iloc[:0].reset_index(drop=True), len(df)
+    positions = np.where(found, positions, 0)
+    prices = df[column].to_numpy()
+    keep = (found & (bounds['count'].to_numpy()[positions] >= min_listings)
+            & (prices >= bounds['lower_bound'].to_numpy()[positions]) & (prices <= bounds['upper_bound'].to_numpy()[positions]))
+    return df[keep].reset_index(drop=True), int(len(df) - keep.sum())
+
+def remove_outliers(df, column='listing_price', min_listings=10, by='Model'):
     if df.empty or column not in df.columns:
         return df, 0
     
     initial_count = len(df)
+    keys = [by] if isinstance(by, str) else list(by)
     
-    def filter_outliers(group):
-        Q1 = group[column].quantile(0.25)
-        Q3 = group[column].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        return group[(group[column] >= lower_bound) & (group[column] <= upper_bound)]
+    # Groups are numbered in sorted key order; rows with a missing key get -1 and are dropped
+    grouped = df.groupby(keys, sort=True, dropna=True)
+    if grouped.ngroups == 0:
+        return df.iloc[:0].reset_index(drop=True), initial_count
+    group_ids = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    in_group = group_ids >= 0
+    group_ids = np.where(in_group, group_ids, 0)
     
-    # Group by 'Model' and apply the outlier filter
-    grouped = df.groupby(['Model'], group_keys=False)
+    # Per-group fences and sizes, broadcast back to the rows
+    bounds = outlier_bounds(df, column=column, by=keys)
+    lower_bound = bounds['lower_bound'].to_numpy()[group_ids]
+    upper_bound = bounds['upper_bound'].to_numpy()[group_ids]
+    sizes = bounds['count'].to_numpy()[group_ids]
     
-    # Filter out groups with fewer than min_listings
-    valid_groups = grouped.filter(lambda x: len(x) >= min_listings)
+    # Filter out groups with fewer than min_listings, then the listings outside the IQR fences
+    prices = df[column].to_numpy()
+    keep = in_group & (sizes >= min_listings) & (prices >= lower_bound) & (prices <= upper_bound)
     
-    filtered = valid_groups.groupby('Model', group_keys=False).apply(filter_outliers)
+    # Rows come out group by group in key order, as groupby.apply returned them; when no listing of a
+    # large enough group was an outlier, apply kept the original row order instead
+    kept = np.flatnonzero(keep)
+    if len(kept) < (in_group & (sizes >= min_listings)).sum():
+        kept = kept[np.argsort(group_ids[kept], kind='stable')]
+    filtered = df.iloc[kept]
     
     final_count = len(filtered)
     removed_count = initial_count - final_count
     
     return filtered.reset_index(drop=True), removed_count
 
-def get_combined_clean_data(directory, series_prefixes, min_listings=0):
-    combined_data = {series: load_and_combine_csv(directory, prefixes) for series, prefixes in series_prefixes.items()}
+# Compact listings number their days from this epoch as int32; days without a date get MISSING_DAY
+DAY_EPOCH = np.datetime64('1970-01-01', 'D')
+MISSING_DAY = np.iinfo(np.int32).min
+TEXT_COLUMNS = ['Link', 'Description']
+
+def compact_listings(df, cents=False, text_columns=()):
+    compact = pd.DataFrame(index=df.index)
+    if 'date' in df.columns:
+        days = df['date'].to_numpy(dtype='datetime64[D]')
+        compact['day'] = np.where(np.isnat(days), MISSING_DAY, (days - DAY_EPOCH).astype(np.int64)).astype(np.int32)
+    for column in ['Model', 'Capacity', 'Series']:
+        if column in df.columns:
+            compact[column] = df[column].astype('category')
+    if 'listing_price' in df.columns:
+        if cents:
+            compact['price_cents'] = (df['listing_price'] * 100).round().astype('Int32')
+        else:
+            compact['listing_price'] = df['listing_price'].astype(np.float32)
+    # Free text is only kept when asked for, dictionary-encoded
+    for column in text_columns:
+        compact[column] = df[column].astype('category')
+    return compact
+
+def days_to_dates(days):
+    days = np.asarray(days)
+    dates = (DAY_EPOCH + days.astype('timedelta64[D]')).astype('datetime64[ns]')
+    return pd.DatetimeIndex(np.where(days == MISSING_DAY, np.datetime64('NaT'), dates))
+
+def get_combined_clean_data(directory, series_prefixes, min_listings=0, store_directory=None, incremental=False, workers=None,
+                            compact=False, cents=False, text_columns=(), columns=None, outlier_by='Model',
+                            cache_directory=None, cache_max_bytes=None):
+    manifest = build_manifest(directory)
+    incremental = incremental and store_directory is not None
+    if cache_directory is not None:
+        import cleancache
+        # Everything that changes the result goes into the key; how it is loaded (store, workers) does not
+        parameters = {'min_listings': min_listings, 'compact': compact, 'cents': cents, 'text_columns': list(text_columns),
+                      'columns': None if columns is None else list(columns), 'outlier_by': outlier_by,
+                      'incremental': incremental}
+        key = cleancache.cache_key(manifest, series_prefixes, parameters, cache_directory)
+        cached = cleancache.load_cached(cache_directory, key)
+        if cached is not None:
+            print("Loaded the cleaned data from the cache")
+            return cached
+    load_columns = None
+    if columns is not None:
+        # Series is not in the files; it is added to the output below. The outlier keys and listing_price
+        # are always loaded because the outlier step needs them.
+        file_columns = [column for column in columns if column != 'Series']
+        outlier_keys = [outlier_by] if isinstance(outlier_by, str) else list(outlier_by)
+        load_columns = list(dict.fromkeys(file_columns + outlier_keys + ['listing_price'] + list(text_columns)))
+    if incremental:
+        import snapshotstore
+        # Only new or changed files are parsed; everything else is read back from the store
+        ingested = snapshotstore.ingest_snapshots(directory, store_directory, manifest=manifest)
+        print(f"Ingested {len(ingested)} new or changed snapshot files")
+    else:
+        cache = new_read_cache(manifest, series_prefixes)
     clean_data = {}
     total_removed = 0
     
-    for series in combined_data:
-        if not combined_data[series].empty:
-            cleaned_df, removed_count = remove_outliers(combined_data[series], min_listings=min_listings)
-            clean_data[series] = cleaned_df
-            total_removed += removed_count
+    for series, prefixes in series_prefixes.items():
+        if incremental:
+            # The outlier step runs over the files no earlier run has cleaned (on the first run all of them, with
+            # the exact fences); the rest comes back as it was cleaned then
+            cleaned_df, removed_count = snapshotstore.clean_new_snapshots(store_directory, manifest, series, prefixes, min_listings=min_listings,
+                                                                          outlier_by=outlier_by, columns=load_columns, workers=workers)
         else:
-            clean_data[series] = pd.DataFrame()
+            # Each series is parsed (across the pool with workers) and cleaned before the next one is read, so
+            # only its raw listings and the files a later series shares are held at a time
+            combined_df = load_and_combine_csv(directory, prefixes, store_directory=store_directory, columns=load_columns, manifest=manifest,
+                                               workers=workers, cache=cache)
+            cleaned_df = None
+            if not combined_df.empty:
+                cleaned_df, removed_count = remove_outliers(combined_df, min_listings=min_listings, by=outlier_by)
+        if cleaned_df is None:
+            clean_data[series] = pd.DataFrame()  # No snapshots for this series
+            continue
+        if columns is not None:
+            cleaned_df = cleaned_df[list(dict.fromkeys(file_columns + list(text_columns)))]
+        if compact:
+            # Drop the free text per series so it never reaches the combined frame
+            cleaned_df = cleaned_df.drop(columns=[column for column in TEXT_COLUMNS if column not in text_columns], errors='ignore')
+        clean_data[series] = cleaned_df
+        total_removed += removed_count
     
     all_data = pd.concat([df.assign(Series=series) for series, df in clean_data.items()], ignore_index=True)
+    if columns is not None and 'Series' in columns:
+        all_data = all_data.reindex(columns=list(dict.fromkeys(list(columns) + list(text_columns))))  # In the order asked for
     
     print(f"Total listings removed by the outlier step: {total_removed}")
     
+    if compact:
+        all_data = compact_listings(all_data, cents=cents, text_columns=text_columns)
+    if cache_directory is not None:
+        cleancache.store_cached(cache_directory, key, all_data, max_bytes=cache_max_bytes or cleancache.MAX_BYTES)
     return all_data
 
+
+def series_outlier_bounds(directory, series_prefixes, column='listing_price', by='Model', store_directory=None, manifest=None, sketched=False):
+    # Fences per series from a first pass over only the group keys and prices. The exact fences hold those
+    # two columns of one series at a time; sketched fences read them file by file into quantile sketches.
+    if manifest is None:
+        manifest = build_manifest(directory)
+    keys = [by] if isinstance(by, str) else list(by)
+    bounds = {}
+    for series, prefixes in series_prefixes.items():
+        frames = (_read_snapshot_file(directory, filename, manifest['snapshots'][filename], store_directory, keys + [column])
+                  for filename in resolve_prefixes(manifest, prefixes))
+        if sketched:
+            import quantilesketch
+            sketches = quantilesketch.new_sketches(keys)
+            for df in frames:
+                quantilesketch.update_sketches(sketches, df, column)
+            bounds[series] = quantilesketch.sketch_bounds(sketches)
+        else:
+            frames = list(frames)
+            bounds[series] = outlier_bounds(pd.concat(frames, ignore_index=True), column=column, by=keys) if frames else None
+    return bounds
+
+def iter_clean_listings(directory, series_prefixes, min_listings=0, bounds=None, batch_size=None, store_directory=None,
+                        columns=None, outlier_by='Model', sketched=False):
+    # Yield the cleaned listings one snapshot file at a time (or in batches of batch_size rows), each filtered
+    # against precomputed per-series fences, so the whole history never has to be in memory at once.
+    # Snapshots are read directly, one at a time, and dropped once their batch is yielded.
+    manifest = build_manifest(directory)
+    keys = [outlier_by] if isinstance(outlier_by, str) else list(outlier_by)
+    if bounds is None:
+        bounds = series_outlier_bounds(directory, series_prefixes, by=keys, store_directory=store_directory, manifest=manifest, sketched=sketched)
+    file_columns = None if columns is None else [column for column in columns if column != 'Series']  # Series is added below
+    load_columns = None if file_columns is None else list(dict.fromkeys(file_columns + keys + ['listing_price']))
+    total_removed = 0
+    pending = []
+    pending_rows = 0
+    
+    for series, prefixes in series_prefixes.items():
+        if bounds.get(series) is None:
+            continue  # No snapshots for this series
+        for filename in resolve_prefixes(manifest, prefixes):
+            df = _read_snapshot_file(directory, filename, manifest['snapshots'][filename], store_directory, load_columns)
+            cleaned_df, removed_count = apply_outlier_bounds(df, bounds[series], by=keys, min_listings=min_listings)
+            total_removed += removed_count
+            if columns is not None:
+                cleaned_df = cleaned_df[file_columns]
+            cleaned_df = cleaned_df.assign(Series=series)
+            if columns is not None and 'Series' in columns:
+                cleaned_df = cleaned_df[list(columns)]
+            if batch_size is None:
+                yield cleaned_df
+                continue
+            # Small files are gathered and large ones split so every batch but the last has batch_size rows
+            pending.append(cleaned_df)
+            pending_rows += len(cleaned_df)
+            while pending_rows >= batch_size:
+                combined = pd.concat(pending, ignore_index=True)
+                yield combined.iloc[:batch_size].reset_index(drop=True)
+                pending = [combined.iloc[batch_size:]]
+                pending_rows -= batch_size
+    
+    if pending_rows > 0:
+        yield pd.concat(pending, ignore_index=True)
+    print(f"Total listings removed by the outlier step: {total_removed}")
+
+def rolled_observed_means(counts, sums, rollback_days):
+    # Mean over each run of rollback_days consecutive observed dates, weighted by their listings, from the
+    # per-date listing counts and price sums in date order. Dates without a full window get NaN.
+    counts = np.concatenate([[0], np.cumsum(counts)])
+    sums = np.concatenate([[0.0], np.cumsum(sums, dtype=np.float64)])
+    rolled = np.full(len(counts) - 1, np.nan)
+    if len(rolled) >= rollback_days:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolled[rollback_days - 1:] = ((sums[rollback_days:] - sums[:-rollback_days])
+                                          / (counts[rollback_days:] - counts[:-rollback_days]))
+    return rolled
+
+def calculate_rolled_prices(data, rollback_days, date_column='Date', price_column='listing_price', statistic='mean', q=0.5, proportion=0.1):
+    # Rolled price on every observed date that has rollback_days observed dates up to and including it:
+    # the mean of all listings on those dates. Dates without listings in between are skipped, not counted.
+    # statistic='median', 'quantile' (q) or 'trimmed_mean' (proportion cut from each end) uses a robust
+    # statistic of the same listings instead.
+    if statistic != 'mean':
+        import orderstatistics
+        return orderstatistics.rolling_order_statistic(data, rollback_days, statistic, q=q, proportion=proportion,
+                                                       date_column=date_column, price_column=price_column)
+    data = data.dropna(subset=[date_column])
+    daily = data[price_column].groupby(data[date_column], sort=True).agg(['count', 'sum'])
+    rolled = rolled_observed_means(daily['count'].to_numpy(), daily['sum'].to_numpy(), rollback_days)
+    return pd.DataFrame({'Date': daily.index[rollback_days - 1:], 'Rolled Price': rolled[rollback_days - 1:]})
+
+def rolled_price_windows(data, models, windows, families=False, date_column='Date', price_column='listing_price', model_column='Model'):
+    # Rolled prices for every window size and model from one set of per-date aggregates and prefix sums.
+    # Models are matched exactly through the registry, or as whole families with families=True. Returns {'rolled': {window: {model: frame}}, 'std': models x windows,
+    # 'periods': models x windows}, where periods counts the rolled prices behind each standard deviation.
+    windows = np.asarray(list(windows), dtype=np.int64)
+    data = data.dropna(subset=[date_column])
+    # Listings (rows) and priced listings with their sum, per date and model, computed once for all models
+    daily = data.groupby([date_column, model_column], sort=True, observed=True)[price_column].agg(['size', 'count', 'sum'])
+    daily = daily.unstack(model_column, fill_value=0)
+    codes = model_codes(daily['size'].columns)
+    
+    rolled = {int(window): {} for window in windows}
+    std_devs = pd.DataFrame(np.nan, index=pd.Index(models, name='Model'), columns=windows)
+    periods = pd.DataFrame(0, index=pd.Index(models, name='Model'), columns=windows)
+    for model in models:
+        matched = daily['size'].columns[np.isin(codes, variant_codes(model, families))]
+        sizes = daily['size'][matched].sum(axis=1).to_numpy()
+        observed = sizes > 0
+        dates = daily.index[observed]
+        counts = np.concatenate([[0], np.cumsum(daily['count'][matched].sum(axis=1).to_numpy()[observed])])
+        sums = np.concatenate([[0.0], np.cumsum(daily['sum'][matched].sum(axis=1).to_numpy(dtype=np.float64)[observed])])
+        
+        # Row i, column j: the mean over the windows[j] observed dates ending at date i, NaN without a full window
+        ends = np.arange(1, len(dates) + 1)[:, None]
+        starts = ends - windows[None, :]
+        complete = starts >= 0
+        starts = np.where(complete, starts, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(complete, (sums[ends] - sums[starts]) / (counts[ends] - counts[starts]), np.nan)
+        
+        for j, window in enumerate(windows):
+            rolled[int(window)][model] = pd.DataFrame({'Date': dates[window - 1:], 'Rolled Price': means[window - 1:, j]})
+        periods.loc[model] = complete.sum(axis=0)
+        std_devs.loc[model] = pd.DataFrame(means).std().to_numpy()
+    return {'rolled': rolled, 'std': std_devs, 'periods': periods}
+
+def rolled_price_panel(data, rollback_days, by='Model', date_column='Date', price_column='listing_price', statistic='mean', q=0.5, proportion=0.1):
+    # calculate_rolled_prices for every group at once: one row per group and observed date that has a full
+    # window. Given a list of window sizes, the panel holds all of them with a leading 'Window' column.
+    keys = [by] if isinstance(by, str) else list(by)
+    data = data.dropna(subset=[date_column])
+    if statistic != 'mean':
+        # Robust statistics need the listings themselves, so every group gets its own order-statistic windows
+        windows = [rollback_days] if np.isscalar(rollback_days) else list(rollback_days)
+        panels = []
+        for key, group in data.groupby(keys, sort=True, observed=True):
+            for window in windows:
+                panel = calculate_rolled_prices(group, window, date_column, price_column, statistic, q, proportion)
+                panel = panel.rename(columns={'Date': date_column})
+                for name, value in zip(keys, key if isinstance(key, tuple) else (key,)):
+                    panel[name] = value
+                if not np.isscalar(rollback_days):
+                    panel['Window'] = window
+                panels.append(panel)
+        columns = (['Window'] if not np.isscalar(rollback_days) else []) + keys + [date_column, 'Rolled Price']
+        return pd.concat(panels, ignore_index=True)[columns] if panels else pd.DataFrame(columns=columns)
+    daily = data.groupby(keys + [date_column], sort=True, observed=True)[price_column].agg(['count', 'sum']).reset_index()
+    grouped = daily.groupby(keys, sort=False, observed=True)
+    position = grouped.cumcount().to_numpy()
+    counts = grouped['count'].cumsum().to_numpy()
+    sums = grouped['sum'].cumsum().to_numpy(dtype=np.float64)
+    
+    windows = [rollback_days] if np.isscalar(rollback_days) else list(rollback_days)
+    panels = []
+    for window in windows:
+        # Running totals window dates back within the same group; nothing to subtract for the group's first window
+        inside = position >= window
+        earlier = np.where(inside, np.arange(len(daily)) - window, 0)
+        complete = position >= window - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolled = (sums - np.where(inside, sums[earlier], 0.0)) / (counts - np.where(inside, counts[earlier], 0))
+        panel = daily.loc[complete, keys + [date_column]].assign(**{'Rolled Price': rolled[complete]})
+        if not np.isscalar(rollback_days):
+            panel.insert(0, 'Window', window)
+        panels.append(panel)
+    return pd.concat(panels, ignore_index=True)
+
+def summarise_rolled_prices(panel, by='Model', date_column='Date'):
+    # First and last rolled price, their difference and ratio, and the standard deviation of the rolled
+    # prices per group (and window). The ratio is rounded to three decimals and NaN when the first price is 0.
+    keys = (['Window'] if 'Window' in panel.columns else []) + ([by] if isinstance(by, str) else list(by))
+    panel = panel.sort_values(keys + [date_column], kind='stable')
+    grouped = panel.groupby(keys, sort=True, observed=True)['Rolled Price']
+    position = grouped.cumcount().to_numpy()
+    size = grouped.transform('size').to_numpy()
+    first = panel.loc[position == 0].set_index(keys)['Rolled Price']
+    last = panel.loc[position == size - 1].set_index(keys)['Rolled Price']
+    summary = pd.DataFrame({'First Price': first, 'Last Price': last})
+    summary['Difference'] = summary['Last Price'] - summary['First Price']
+    ratios = (summary['Last Price'] / summary['First Price']).where(summary['First Price'] != 0)
+    summary['Ratio'] = [round(ratio, 3) for ratio in ratios]  # Python's round, as the tables always used
+    summary['Standard Deviation'] = grouped.std()
+    return summary
@@ -0,0 +1,68 @@
+import pandas as pd
+import numpy as np
+from quantilesketch import new_sketch, add_to_sketch, sketch_quantile, RELATIVE_ACCURACY
+
+# Per-group descriptives (the columns of describe()) folded in one batch at a time. Count, mean and
+# standard deviation come from Welford moments merged per batch (Chan et al.), min and max are tracked
+# exactly, and the quartiles come from a quantile sketch, so the raw prices are never held. With
+# exact=True every group keeps its prices instead and describe() runs on them at the end.
+DESCRIBE_COLUMNS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+def new_descriptives(by='Series', exact=False, relative_accuracy=RELATIVE_ACCURACY):
+    return {'by': [by] if isinstance(by, str) else list(by), 'exact': exact, 'relative_accuracy': relative_accuracy, 'groups': {}}
+
+def _new_group(state):
+    group = {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf}
+    if state['exact']:
+        group['values'] = []
+    else:
+        group['sketch'] = new_sketch()
+    return group
+
+def update_descriptives(state, batch, column='listing_price'):
+    batch = batch.dropna(subset=[column])
+    by = state['by'] if len(state['by']) > 1 else state['by'][0]
+    grouped = batch.groupby(by, sort=True, observed=True)[column]
+    moments = grouped.agg(['count', 'mean', 'min', 'max'])
+    moments['m2'] = grouped.var(ddof=0) * moments['count']
+    for (key, prices), (count, mean, minimum, maximum, m2) in zip(grouped, moments.itertuples(index=False, name=None)):
+        group = state['groups'].setdefault(key, _new_group(state))
+        # Merge the batch's moments into the running ones
+        total = group['count'] + count
+        delta = mean - group['mean']
+        group['mean'] += delta * count / total
+        group['m2'] += m2 + delta * delta * group['count'] * count / total
+        group['count'] = int(total)
+        group['min'] = min(group['min'], minimum)
+        group['max'] = max(group['max'], maximum)
+        if state['exact']:
+            group['values'].append(prices.to_numpy())
+        else:
+            add_to_sketch(group['sketch'], prices.to_numpy(), state['relative_accuracy'])
+    return state
+
+def descriptives_table(state):
+    # Same layout as groupby(by)[column].describe(), one row per group in sorted key order
+    keys = sorted(state['groups'])
+    rows = []
+    for key in keys:
+        group = state['groups'][key]
+        if state['exact']:
+            rows.append(pd.Series(np.concatenate(group['values'])).describe())
+            continue
+        count = group['count']
+        quartiles = [sketch_quantile(group['sketch'], q, state['relative_accuracy']) for q in (0.25, 0.5, 0.75)]
+        rows.append(pd.Series([count, group['mean'], np.sqrt(group['m2'] / (count - 1)) if count > 1 else np.nan,
+                               group['min'], *quartiles, group['max']], index=DESCRIBE_COLUMNS))
+    if len(state['by']) > 1:
+        index = pd.MultiIndex.from_tuples(keys, names=state['by'])
+    else:
+        index = pd.Index(keys, name=state['by'][0])
+    return pd.DataFrame(rows, index=index, columns=DESCRIBE_COLUMNS)
+
+def stream_descriptives(batches, by='Series', column='listing_price', exact=False):
+    # One pass over an iterable of listing batches, e.g. dataclean.iter_clean_listings
+    state = new_descriptives(by, exact)
+    for batch in batches:
+        update_descriptives(state, batch, column)
+    return descriptives_table(state)
@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+
+# Order statistics of a sliding multiset of prices. Every price the series will ever hold is known up
+# front, so the multiset is a listing count per distinct price (in sorted order) plus an index level above
+# it, like the express lane of an indexable skiplist: the same counts and price sums per block of
+# sqrt(distinct prices) neighbours. Adding or removing a date's listings touches only their own entries,
+# and the k-th smallest price or the sum of the k smallest is found by walking the blocks and then one
+# block, so nothing is ever re-sorted. That bookkeeping costs about as much per date as sorting 25 dates of
+# listings, so windows shorter than SORT_CROSSOVER_DAYS or smaller than SORT_CROSSOVER_LISTINGS (every
+# window the scripts use) are simply sorted from scratch instead; see Benchmarks/order_statistics.py.
+STATISTICS = ['median', 'quantile', 'trimmed_mean']
+METHODS = [None, 'sort', 'index']
+SORT_CROSSOVER_DAYS = 25
+SORT_CROSSOVER_LISTINGS = 25_000
+
+def new_order_index(values):
+    values = np.unique(np.asarray(values, dtype=np.float64))
+    values = values[~np.isnan(values)]
+    block_size = max(64, int(np.sqrt(len(values))))
+    blocks = -(-len(values) // block_size)
+    return {'values': values, 'counts': np.zeros(len(values), dtype=np.int64), 'block_size': block_size,
+            'block_counts': np.zeros(blocks, dtype=np.int64), 'block_sums': np.zeros(blocks), 'size': 0}
+
+def update_order_index(index, ranks, sign=1):
+    # Add (sign=1) or remove (sign=-1) a batch of listings given by their price ranks
+    ranks = ranks[ranks >= 0]
+    index['size'] += sign * len(ranks)
+    np.add.at(index['counts'], ranks, sign)
+    blocks = ranks // index['block_size']
+    minlength = len(index['block_counts'])
+    index['block_counts'] += sign * np.bincount(blocks, minlength=minlength)
+    index['block_sums'] += sign * np.bincount(blocks, weights=index['values'][ranks], minlength=minlength)
+
+def _locate(index, k):
+    # The 0-based position of the k-th smallest price, with the count and price sum of everything before it
+    block_counts = np.cumsum(index['block_counts'])
+    block = int(np.searchsorted(block_counts, k))
+    first = block * index['block_size']
+    before = int(block_counts[block - 1]) if block else 0
+    counts = index['counts'][first:first + index['block_size']]
+    offset = int(np.searchsorted(np.cumsum(counts), k - before))
+    total = index['block_sums'][:block].sum() + np.dot(counts[:offset], index['values'][first:first + offset])
+    return first + offset, before + int(counts[:offset].sum()), total
+
+def kth_smallest(index, k):
+    # k counts from 1
+    position, _, _ = _locate(index, k)
+    return index['values'][position]
+
+def sum_smallest(index, k):
+    if k <= 0:
+        return 0.0
+    position, below, total = _locate(index, k)
+    return total + (k - below) * index['values'][position]
+
+def index_quantile(index, q):
+    # Linear interpolation between neighbouring order statistics, like pandas' default quantile
+    if index['size'] == 0:
+        return np.nan
+    position = q * (index['size'] - 1)
+    lower = int(np.floor(position))
+    upper = int(np.ceil(position))
+    low_value = kth_smallest(index, lower + 1)
+    return low_value + (kth_smallest(index, upper + 1) - low_value) * (position - lower)
+
+def index_trimmed_mean(index, proportion):
+    # Mean after cutting int(proportion * n) listings from each end, as scipy.stats.trim_mean does
+    size = index['size']
+    cut = int(proportion * size)
+    if size - 2 * cut <= 0:
+        return np.nan
+    return (sum_smallest(index, size - cut) - sum_smallest(index, cut)) / (size - 2 * cut)
+
+def sorted_window_statistic(window, statistic='median', q=0.5, proportion=0.1):
+    # The same statistics from a window sorted in ascending order (NaN, which sorts last, is ignored)
+    size = len(window) - int(np.isnan(window).sum())
+    if statistic == 'trimmed_mean':
+        cut = int(proportion * size)
+        return window[cut:size - cut].mean() if size - 2 * cut > 0 else np.nan
+    if size == 0:
+        return np.nan
+    position = (0.5 if statistic == 'median' else q) * (size - 1)
+    lower = int(np.floor(position))
+    upper = int(np.ceil(position))
+    return window[lower] + (window[upper] - window[lower]) * (position - lower)
+
+def rolling_order_statistic(data, rollback_days, statistic='median', q=0.5, proportion=0.1, date_column='Date', price_column='listing_price',
+                            method=None):
+    # Same windows as calculate_rolled_prices (the last rollback_days observed dates), with a robust statistic
+    # of all listings in the window instead of their mean: 'median', 'quantile' (q) or 'trimmed_mean' (proportion).
+    # method 'sort' sorts every window, 'index' keeps the order index; by default the window size decides.
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown rolling statistic {statistic!r}, expected one of {STATISTICS}")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    data = data.dropna(subset=[date_column])
+    if not data[date_column].is_monotonic_increasing:
+        data = data.sort_values(date_column, kind='stable')
+    days = data[date_column].to_numpy()
+    starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]])) if len(days) else np.zeros(0, dtype=np.int64)
+    dates = days[starts]
+    prices = data[price_column].to_numpy(dtype=np.float64)
+    if method is None:
+        window_listings = len(prices) / len(dates) * rollback_days if len(dates) else 0
+        method = 'index' if rollback_days >= SORT_CROSSOVER_DAYS and window_listings >= SORT_CROSSOVER_LISTINGS else 'sort'
+    if method == 'sort':
+        ends = np.append(starts[1:], len(prices))
+        rolled = [sorted_window_statistic(np.sort(prices[starts[day - rollback_days + 1]:ends[day]]), statistic, q, proportion)
+                  for day in range(rollback_days - 1, len(dates))]
+    else:
+        rolled = _indexed_windows(prices, starts, rollback_days, statistic, q, proportion)
+    return pd.DataFrame({'Date': pd.DatetimeIndex(dates[rollback_days - 1:]) if len(dates) else pd.DatetimeIndex([]), 'Rolled Price': rolled})
+
+def _indexed_windows(prices, starts, rollback_days, statistic, q, proportion):
+    # Ranks straight from the one sort that finds the distinct prices
+    priced = ~np.isnan(prices)
+    values, inverse = np.unique(prices[priced], return_inverse=True)
+    ranks = np.full(len(prices), -1, dtype=np.int64)
+    ranks[priced] = inverse
+    index = new_order_index(values)
+    batches = np.split(ranks, starts[1:]) if len(starts) else []
+    rolled = []
+    for day, batch in enumerate(batches):
+        update_order_index(index, batch)
+        if day >= rollback_days:
+            update_order_index(index, batches[day - rollback_days], sign=-1)
+        if day < rollback_days - 1:
+            continue
+        if statistic == 'trimmed_mean':
+            rolled.append(index_trimmed_mean(index, proportion))
+        else:
+            rolled.append(index_quantile(index, 0.5 if statistic == 'median' else q))
+    return rolled
@@ -0,0 +1,172 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import cleancache
+from dataclean import build_manifest, get_combined_clean_data, rolled_observed_means
+
+# Per day x series x model x capacity statistics of the cleaned listings, one .npy file per statistic so every
+# script can memory-map them without copying. axes.json names the cells and is written last. Every price table
+# the scripts use (pricepivot included) is a reduction of these arrays, so there is one aggregation path.
+STATISTICS = ['count', 'sum', 'sum_squares', 'min', 'max']
+AXES = ['Series', 'Model', 'Capacity']
+AXES_FILENAME = 'axes.json'
+UNKNOWN_CAPACITY = 'Unknown'
+
+def price_cube_arrays(data, date_column='date', price_column='listing_price'):
+    # The cube in memory, laid out like open_price_cube returns it
+    data = data.dropna(subset=[date_column, price_column])
+    days = data[date_column].to_numpy(dtype='datetime64[D]')
+    first_day = days.min() if len(days) else np.datetime64('1970-01-01')
+    codes = [(days - first_day).astype(np.int64)]
+    labels = {}
+    for axis in AXES:
+        # Missing labels (in practice only capacities) become 'Unknown'; a frame without a Series column still gets a one-label axis
+        values = data[axis].fillna(UNKNOWN_CAPACITY) if axis in data else pd.Series('', index=data.index)
+        axis_codes, axis_labels = pd.factorize(values, sort=True)
+        codes.append(axis_codes)
+        labels[axis] = [label.item() if isinstance(label, np.generic) else label for label in axis_labels]
+    shape = (int(codes[0].max()) + 1 if len(days) else 0,) + tuple(len(labels[axis]) for axis in AXES)
+
+    # One flat cell index per listing; every statistic is then a single grouped reduction
+    cells = np.ravel_multi_index(codes, shape)
+    prices = data[price_column].to_numpy(dtype=np.float64)
+    size = int(np.prod(shape))
+    extremes = pd.Series(prices).groupby(cells).agg(['min', 'max'])
+    minimum = np.full(size, np.nan)
+    maximum = np.full(size, np.nan)
+    minimum[extremes.index] = extremes['min']
+    maximum[extremes.index] = extremes['max']
+    cube = {
+        'count': np.bincount(cells, minlength=size).astype(np.int64),
+        'sum': np.bincount(cells, weights=prices, minlength=size),
+        'sum_squares': np.bincount(cells, weights=prices * prices, minlength=size),
+        'min': minimum,
+        'max': maximum
+    }
+    cube = {statistic: values.reshape(shape) for statistic, values in cube.items()}
+    cube['dates'] = pd.date_range(str(first_day), periods=shape[0], freq='D')
+    cube.update(labels)
+    return cube
+
+def build_price_cube(data, cube_directory):
+    cube = price_cube_arrays(data)
+    os.makedirs(cube_directory, exist_ok=True)
+    for statistic in STATISTICS:
+        path = os.path.join(cube_directory, f'{statistic}.npy')
+        with open(path + '.tmp', 'wb') as file:
+            np.save(file, cube[statistic])
+        os.replace(path + '.tmp', path)
+    axes = {'first_day': str(cube['dates'][0].date()) if len(cube['dates']) else '1970-01-01'}
+    axes.update({axis: cube[axis] for axis in AXES})
+    with open(os.path.join(cube_directory, AXES_FILENAME + '.tmp'), 'w', encoding='utf-8') as file:
+        json.dump(axes, file, indent=1)
+    os.replace(os.path.join(cube_directory, AXES_FILENAME + '.tmp'), os.path.join(cube_directory, AXES_FILENAME))
+
+def open_price_cube(cube_directory):
+    with open(os.path.join(cube_directory, AXES_FILENAME), encoding='utf-8') as file:
+        axes = json.load(file)
+    cube = {statistic: np.load(os.path.join(cube_directory, f'{statistic}.npy'), mmap_mode='r') for statistic in STATISTICS}
+    cube['dates'] = pd.date_range(axes['first_day'], periods=cube['count'].shape[0], freq='D')
+    cube.update({axis: axes[axis] for axis in AXES})
+    return cube
+
+def load_price_cube(directory, series_prefixes, min_listings=0, outlier_by='Model', store_directory=None, cache_directory=None,
+                    cache_max_bytes=None):
+    # The cube of the cleaned listings, memory-mapped from a cleancache directory entry keyed by the snapshot
+    # files and the cleaning options; without a cache directory it is built in memory
+    if cache_directory is not None:
+        manifest = build_manifest(directory)
+        parameters = {'cube': STATISTICS, 'min_listings': min_listings, 'outlier_by': outlier_by}
+        key = cleancache.cache_key(manifest, series_prefixes, parameters, cache_directory)
+        path = cleancache.load_cached_directory(cache_directory, key)
+        if path is not None:
+            return open_price_cube(path)
+    data = get_combined_clean_data(directory, series_prefixes, min_listings=min_listings, store_directory=store_directory,
+                                   columns=['date', 'Model', 'Capacity', 'listing_price'], outlier_by=outlier_by)
+    if cache_directory is None:
+        return price_cube_arrays(data)
+    path = cleancache.store_cached_directory(cache_directory, key, lambda path: build_price_cube(data, path),
+                                             max_bytes=cache_max_bytes or cleancache.MAX_BYTES)
+    return open_price_cube(path)
+
+def _select_capacities(cube, capacities):
+    if capacities is None:
+        return slice(None)
+    if isinstance(capacities, str):
+        capacities = [capacities]
+    return [cube['Capacity'].index(capacity) for capacity in capacities]
+
+def reduce_cube(cube, by='Model', capacities=None):
+    # Day x by frames of the additive statistics (count, sum, sum_squares, min, max) over the selected capacities.
+    # by is any of 'Series', 'Model' and 'Capacity' or a list of them (the columns are then a MultiIndex);
+    # combinations without a single listing are left out.
+    keys = [by] if isinstance(by, str) else list(by)
+    if not keys or any(key not in AXES for key in keys):
+        raise ValueError(f"Unknown cube axes {by!r}, expected some of {AXES}")
+    selected = (slice(None), slice(None), slice(None), _select_capacities(cube, capacities))
+    kept = [AXES.index(key) + 1 for key in keys]
+    summed = tuple(axis for axis in range(1, 4) if axis not in kept)
+    # NaN marks a cell without listings, so the extremes skip it (and an empty cube reduces to NaN)
+    reductions = {'count': np.sum, 'sum': np.sum, 'sum_squares': np.sum,
+                  'min': lambda values, axis: np.fmin.reduce(values, axis=axis, initial=np.nan),
+                  'max': lambda values, axis: np.fmax.reduce(values, axis=axis, initial=np.nan)}
+    arrays = {}
+    for statistic, reduce in reductions.items():
+        values = np.asarray(cube[statistic][selected])
+        for axis in reversed(summed):
+            values = reduce(values, axis=axis)
+        # Kept axes in the order of by, flattened into one column axis
+        order = [0] + [sorted(kept).index(axis) + 1 for axis in kept]
+        arrays[statistic] = values.transpose(order).reshape(values.shape[0], int(np.prod(values.shape[1:])))
+    labels = [cube[key] if key != 'Capacity' or capacities is None else
+              [cube['Capacity'][index] for index in selected[3]] for key in keys]
+    columns = pd.MultiIndex.from_product(labels, names=keys) if len(keys) > 1 else pd.Index(labels[0], name=keys[0])
+    observed = arrays['count'].sum(axis=0) > 0
+    index = pd.Index(cube['dates'], name='date')
+    return {statistic: pd.DataFrame(values[:, observed], index=index, columns=columns[observed]) for statistic, values in arrays.items()}
+
+def cube_statistics(moments):
+    # count, mean, std, min and max from the frames of reduce_cube, on any calendar (sums resample as sums)
+    count = moments['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = moments['sum'] / count
+        variance = (moments['sum_squares'] - count * mean * mean) / (count - 1)
+    return {
+        'count': count,
+        'mean': mean,
+        'std': np.sqrt(variance.clip(lower=0)).where(count > 1),
+        'min': moments['min'],
+        'max': moments['max']
+    }
+
+def daily_statistics(cube, capacities=None, by='Model'):
+    # Day x model (or by) frames of count, mean, std, min and max, summed over the selected capacities
+    return cube_statistics(reduce_cube(cube, by, capacities))
+
+def daily_mean_pivot(cube, capacities=None, by='Model'):
+    # Same table as groupby(['date', 'Model']).mean() -> pivot -> asfreq('D'), straight from the cube
+    return daily_statistics(cube, capacities, by)['mean']
+
+def rolled_mean_pivot(cube, rollback_days, capacities=None, by='Model'):
+    # Mean over the last rollback_days observed dates of each column, weighted by the number of listings
+    moments = reduce_cube(cube, by, capacities)
+    count = moments['count'].to_numpy()
+    total = moments['sum'].to_numpy()
+    rolled = np.full(count.shape, np.nan)
+    for column in range(count.shape[1]):
+        observed = np.flatnonzero(count[:, column])
+        if len(observed) < rollback_days:
+            continue
+        rolled[observed, column] = rolled_observed_means(count[observed, column], total[observed, column], rollback_days)
+    return pd.DataFrame(rolled, index=moments['count'].index, columns=moments['count'].columns)
+
+if __name__ == "__main__":
+    # Usage: python pricecube.py <csv directory> <cube directory>
+    manifest = build_manifest(sys.argv[1])
+    series_prefixes = {f"iPhone {series}": f"iphone_{series}_"
+                       for series in sorted({snapshot['series'] for snapshot in manifest['snapshots'].values() if snapshot['series']})}
+    data = get_combined_clean_data(sys.argv[1], series_prefixes, columns=['date', 'Model', 'Capacity', 'listing_price'])
+    build_price_cube(data, sys.argv[2])
+    print(f"Price cube for {len(data)} listings written to {sys.argv[2]}")
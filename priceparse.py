@@ -0,0 +1,88 @@
+import numpy as np
+
+# Every character is first mapped to a small class: its value for digits, otherwise one of these
+IGNORABLE, COMMA, DOT, INVALID = 10, 11, 12, 13
+
+def _character_classes(size):
+    classes = np.full(size, INVALID, dtype=np.uint8)
+    classes[ord('0'):ord('9') + 1] = np.arange(10)
+    classes[[0, ord(' ')]] = IGNORABLE  # Fixed-width padding and spaces
+    classes[ord(',')] = COMMA
+    classes[ord('.')] = DOT
+    return classes
+
+# Unicode code points: the euro sign and non-breaking space are ignorable, anything above '€' is invalid
+CODE_POINT_CLASSES = _character_classes(ord('€') + 2)
+CODE_POINT_CLASSES[[0xA0, ord('€')]] = IGNORABLE
+# UTF-8 bytes: the bytes of '€' (E2 82 AC) and of a non-breaking space (C2 A0) are ignorable
+BYTE_CLASSES = _character_classes(256)
+BYTE_CLASSES[[0xA0, 0xC2, 0xE2, 0x82, 0xAC]] = IGNORABLE
+
+def parse_euro_prices(values, cents=False):
+    # Parse Dutch-formatted prices ('€ 1.234,56') straight from the characters, without intermediate strings.
+    # Returns (prices, failed): float64 euros (NaN where parsing failed) or int64 cents (0 where it failed),
+    # and a boolean mask of the rows that could not be parsed.
+    values = np.asarray(values)
+    count = len(values)
+    if values.dtype.kind in 'iuf':
+        failed = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(count, dtype=bool)
+        if cents:
+            return np.where(failed, 0, np.rint(np.nan_to_num(values) * 100)).astype(np.int64), failed
+        return values.astype(np.float64), failed
+    if count == 0:
+        # A header-only snapshot; also avoids reshaping an empty character buffer below
+        return (np.zeros(0, dtype=np.int64) if cents else np.zeros(0)), np.zeros(0, dtype=bool)
+    if values.dtype.kind == 'O':
+        values = values.astype('U')  # Missing values become 'nan' and fail below
+    if values.dtype.itemsize == 0:
+        failed = np.ones(count, dtype=bool)
+        return (np.zeros(count, dtype=np.int64) if cents else np.full(count, np.nan)), failed
+
+    if values.dtype.kind == 'U':
+        codes = values.view(np.uint32).reshape(count, -1)
+        classes = CODE_POINT_CLASSES[np.minimum(codes, len(CODE_POINT_CLASSES) - 1)]
+    else:
+        classes = BYTE_CLASSES[values.view(np.uint8).reshape(count, -1)]
+    # One column per character position, each contiguous, scanned left to right for all rows at once
+    classes = np.ascontiguousarray(classes.T)
+
+    mantissa = np.zeros(count, dtype=np.int64)
+    digit_count = np.zeros(count, dtype=np.int16)
+    since_separator = np.zeros(count, dtype=np.int16)  # Digits since the last dot or comma
+    first_group = np.zeros(count, dtype=np.int16)  # Digits before the first dot
+    comma_count = np.zeros(count, dtype=np.int16)
+    dot_count = np.zeros(count, dtype=np.int16)
+    failed = np.zeros(count, dtype=bool)
+    for column in classes:
+        is_digit = column < 10
+        mantissa = np.where(is_digit, mantissa * 10 + column, mantissa)
+        digit_count += is_digit
+        since_separator += is_digit
+
+        is_comma = column == COMMA
+        is_dot = column == DOT
+        # Thousands groups after the first one hold exactly three digits, and no dot follows the comma
+        failed |= is_dot & (comma_count > 0)
+        failed |= (is_dot | is_comma) & (dot_count > 0) & (since_separator != 3)
+        first_group = np.where(is_dot & (dot_count == 0), since_separator, first_group)
+        comma_count += is_comma
+        dot_count += is_dot
+        since_separator[is_dot | is_comma] = 0
+        failed |= column == INVALID
+
+    # Without a comma, a single dot followed by one or two digits ('329.62') is a decimal point
+    dot_is_decimal = (comma_count == 0) & (dot_count == 1) & (since_separator >= 1) & (since_separator <= 2)
+    fraction_digits = np.where((comma_count == 1) | dot_is_decimal, since_separator, 0)
+    grouped = (dot_count > 0) & ~dot_is_decimal
+    failed |= grouped & ((first_group < 1) | (first_group > 3))
+    failed |= grouped & (comma_count == 0) & (since_separator != 3)
+    failed |= (comma_count > 1) | (digit_count == 0) | (digit_count > 18)
+
+    if cents:
+        scale = 2 - fraction_digits
+        prices = np.where(scale >= 0,
+                          mantissa * 10 ** np.clip(scale, 0, None).astype(np.int64),
+                          np.rint(mantissa / 10.0 ** np.clip(-scale, 0, None)).astype(np.int64))
+        return np.where(failed, 0, prices), failed
+    prices = mantissa / 10.0 ** fraction_digits
+    return np.where(failed, np.nan, prices), failed
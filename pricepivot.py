@@ -0,0 +1,80 @@
+import pandas as pd
+import numpy as np
+from dataclean import get_combined_clean_data
+from pricecube import price_cube_arrays, load_price_cube, reduce_cube, cube_statistics, UNKNOWN_CAPACITY
+
+# The daily price table the forecasting scripts model: one row per period, one column per series, model or
+# (model, capacity). The aggregations the cube's additive statistics determine are read off the price cube
+# (a coarser freq resamples those before the mean or std is taken); order statistics such as the median
+# cannot be rebuilt from them, so those group the listings themselves.
+CUBE_AGGREGATIONS = ['mean', 'count', 'std', 'min', 'max']
+AGGREGATIONS = CUBE_AGGREGATIONS + ['median']
+FILLS = [None, 'ffill', 'zero', 'interpolate']
+RESAMPLED = {'count': 'sum', 'sum': 'sum', 'sum_squares': 'sum', 'min': 'min', 'max': 'max'}
+
+def _check_options(aggregation, fill):
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {aggregation!r}, expected one of {AGGREGATIONS}")
+    if fill not in FILLS:
+        raise ValueError(f"Unknown fill {fill!r}, expected one of {FILLS}")
+
+def _fill_pivot(pivot, aggregation, fill):
+    # Periods without listings are kept as rows and filled forward, with zeros, by time interpolation or not at all
+    if fill == 'ffill':
+        pivot = pivot.ffill()
+    elif fill == 'zero':
+        pivot = pivot.fillna(0)
+        if aggregation == 'count':
+            pivot = pivot.astype(np.int64)
+    elif fill == 'interpolate':
+        pivot = pivot.interpolate(method='time')
+    return pivot
+
+def cube_price_pivot(cube, by='Model', aggregation='mean', freq='D', fill='ffill', capacities=None):
+    # by is 'Series', 'Model', 'Capacity' or a list such as ['Model', 'Capacity'] (the columns are then a MultiIndex)
+    _check_options(aggregation, fill)
+    if aggregation not in CUBE_AGGREGATIONS:
+        raise ValueError(f"The price cube has no {aggregation!r}; build the pivot from the listings with build_price_pivot")
+    moments = reduce_cube(cube, by, capacities)
+    if freq != 'D':
+        moments = {statistic: frame.resample(freq).agg(RESAMPLED[statistic]) for statistic, frame in moments.items()}
+    pivot = cube_statistics(moments)[aggregation]
+    pivot = pivot.where(moments['count'] > 0).astype(np.float64)  # A period without listings has no value, not a zero count
+    return _fill_pivot(pivot, aggregation, fill)
+
+def grouped_price_pivot(data, by='Model', aggregation='median', freq='D', fill='ffill', date_column='date', price_column='listing_price'):
+    # The same table from one grouped aggregation over the listings, for the order statistics the cube lacks
+    _check_options(aggregation, fill)
+    keys = [by] if isinstance(by, str) else list(by)
+    data = data.dropna(subset=[date_column, price_column])
+    if 'Capacity' in keys:
+        data = data.assign(Capacity=data['Capacity'].fillna(UNKNOWN_CAPACITY))  # Labelled as in the cube
+    if not pd.api.types.is_datetime64_any_dtype(data[date_column]):
+        data = data.assign(**{date_column: pd.to_datetime(data[date_column])})
+    grouped = data.groupby([pd.Grouper(key=date_column, freq=freq)] + keys, sort=True, observed=True)[price_column]
+    pivot = grouped.agg(aggregation).unstack(keys if len(keys) > 1 else keys[0])
+    pivot = pivot.asfreq(freq)  # Every period between the first and the last, with or without listings
+    pivot.index.name = 'date'
+    return _fill_pivot(pivot, aggregation, fill)
+
+def build_price_pivot(data, by='Model', aggregation='mean', freq='D', fill='ffill', date_column='date', price_column='listing_price'):
+    # The pivot of a frame of listings, through an in-memory cube where the aggregation allows it
+    if aggregation not in CUBE_AGGREGATIONS:
+        return grouped_price_pivot(data, by, aggregation, freq, fill, date_column, price_column)
+    return cube_price_pivot(price_cube_arrays(data, date_column, price_column), by, aggregation, freq, fill)
+
+def load_price_pivot(directory, series_prefixes, by='Model', aggregation='mean', freq='D', fill='ffill', min_listings=0,
+                     outlier_by='Model', store_directory=None, cache_directory=None, cache_max_bytes=None):
+    # The pivot of the cleaned listings. With a cache directory the cube is memory-mapped from cleancache, so one
+    # cached cube serves every by, aggregation, freq and fill and a warm run never loads a listing; a median
+    # instead groups the cleaned listings, which are then cached by get_combined_clean_data.
+    if aggregation not in CUBE_AGGREGATIONS:
+        keys = [by] if isinstance(by, str) else list(by)
+        columns = list(dict.fromkeys(['date'] + [key for key in keys if key != 'Series'] + ['listing_price']))
+        data = get_combined_clean_data(directory, series_prefixes, min_listings=min_listings, store_directory=store_directory,
+                                       columns=columns, outlier_by=outlier_by, cache_directory=cache_directory,
+                                       cache_max_bytes=cache_max_bytes)
+        return grouped_price_pivot(data, by, aggregation, freq, fill)
+    cube = load_price_cube(directory, series_prefixes, min_listings=min_listings, outlier_by=outlier_by, store_directory=store_directory,
+                           cache_directory=cache_directory, cache_max_bytes=cache_max_bytes)
+    return cube_price_pivot(cube, by, aggregation, freq, fill)
@@ -0,0 +1,159 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+from dataclean import outlier_bounds, apply_outlier_bounds, normalise_models
+
+# Mergeable quantile sketches with log-spaced buckets (DDSketch style): a price x lands in bucket
+# ceil(log_gamma(x)), and every quantile read back is within RELATIVE_ACCURACY of an exact one.
+# Merging two sketches just adds their bucket counts, so a day's prices fold in without the history.
+RELATIVE_ACCURACY = 0.005
+
+def _gamma(relative_accuracy):
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+def new_sketch():
+    return {'offset': 0, 'counts': np.zeros(0, dtype=np.int64), 'zero_count': 0}
+
+def _add_bucket_counts(sketch, offset, counts):
+    if len(sketch['counts']) == 0:
+        sketch['offset'], sketch['counts'] = offset, np.array(counts, dtype=np.int64)
+        return
+    start = min(sketch['offset'], offset)
+    end = max(sketch['offset'] + len(sketch['counts']), offset + len(counts))
+    merged = np.zeros(end - start, dtype=np.int64)
+    merged[sketch['offset'] - start:sketch['offset'] - start + len(sketch['counts'])] += sketch['counts']
+    merged[offset - start:offset - start + len(counts)] += counts
+    sketch['offset'], sketch['counts'] = start, merged
+
+def add_to_sketch(sketch, values, relative_accuracy=RELATIVE_ACCURACY):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    positive = values[values > 0]
+    sketch['zero_count'] += len(values) - len(positive)  # Free or invalid prices share one bucket
+    if len(positive):
+        buckets = np.ceil(np.log(positive) / np.log(_gamma(relative_accuracy))).astype(np.int64)
+        _add_bucket_counts(sketch, int(buckets.min()), np.bincount(buckets - buckets.min()))
+    return sketch
+
+def merge_sketches(first, second):
+    merged = {'offset': first['offset'], 'counts': first['counts'].copy(), 'zero_count': first['zero_count'] + second['zero_count']}
+    if len(second['counts']):
+        _add_bucket_counts(merged, second['offset'], second['counts'])
+    return merged
+
+def sketch_count(sketch):
+    return int(sketch['zero_count'] + sketch['counts'].sum())
+
+def sketch_quantile(sketch, q, relative_accuracy=RELATIVE_ACCURACY):
+    count = sketch_count(sketch)
+    if count == 0:
+        return np.nan
+    gamma = _gamma(relative_accuracy)
+    cumulative = np.cumsum(sketch['counts'])
+
+    def value_at(rank):
+        if rank < sketch['zero_count']:
+            return 0.0
+        bucket = np.searchsorted(cumulative, rank - sketch['zero_count'] + 1)
+        return 2 * gamma ** (sketch['offset'] + bucket) / (gamma + 1)
+
+    # Interpolate between neighbouring order statistics like pandas' default linear quantile
+    position = q * (count - 1)
+    lower = int(np.floor(position))
+    upper = int(np.ceil(position))
+    return value_at(lower) + (value_at(upper) - value_at(lower)) * (position - lower)
+
+def update_sketches(sketches, df, column='listing_price'):
+    # Fold the listings of df into the per-group sketches, creating groups that are new
+    keys = sketches['by']
+    for key, prices in df.groupby(keys, sort=True, dropna=True)[column]:
+        key = key if isinstance(key, tuple) else (key,)
+        sketch = sketches['groups'].setdefault(key, new_sketch())
+        add_to_sketch(sketch, prices.to_numpy(), sketches['relative_accuracy'])
+    return sketches
+
+def sketch_bounds(sketches):
+    # Same layout as dataclean.outlier_bounds, with the quartiles read from the sketches
+    keys = sketches['by']
+    groups = sorted(sketches['groups'])
+    accuracy = sketches['relative_accuracy']
+    if len(keys) > 1:
+        index = pd.MultiIndex.from_tuples(groups, names=keys)
+    else:
+        index = pd.Index([group[0] for group in groups], name=keys[0])
+    bounds = pd.DataFrame({
+        'count': [sketch_count(sketches['groups'][group]) for group in groups],
+        'Q1': [sketch_quantile(sketches['groups'][group], 0.25, accuracy) for group in groups],
+        'Q3': [sketch_quantile(sketches['groups'][group], 0.75, accuracy) for group in groups]
+    }, index=index)
+    IQR = bounds['Q3'] - bounds['Q1']
+    bounds['lower_bound'] = bounds['Q1'] - 1.5 * IQR
+    bounds['upper_bound'] = bounds['Q3'] + 1.5 * IQR
+    return bounds
+
+def new_sketches(by='Model', relative_accuracy=RELATIVE_ACCURACY):
+    return {'by': [by] if isinstance(by, str) else list(by), 'relative_accuracy': relative_accuracy, 'groups': {}}
+
+def _encode_key_part(part):
+    # Group keys may hold dates (e.g. by=['Model', 'date']); they are stored tagged so they load back as Timestamps
+    if isinstance(part, (pd.Timestamp, np.datetime64)):
+        return {'timestamp': pd.Timestamp(part).isoformat()}
+    if isinstance(part, np.generic):
+        return part.item()
+    return part
+
+def _decode_key_part(part):
+    return pd.Timestamp(part['timestamp']) if isinstance(part, dict) else part
+
+def save_sketches(path, sketches):
+    state = {
+        'by': sketches['by'],
+        'relative_accuracy': sketches['relative_accuracy'],
+        'groups': [{'key': [_encode_key_part(part) for part in key], 'offset': sketch['offset'], 'counts': sketch['counts'].tolist(), 'zero_count': sketch['zero_count']}
+                   for key, sketch in sorted(sketches['groups'].items())]
+    }
+    # Serialised before the temporary file is opened, so a failure leaves nothing behind
+    text = json.dumps(state)
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(path + '.tmp', path)
+
+def load_sketches(path, by='Model', relative_accuracy=RELATIVE_ACCURACY):
+    if not os.path.exists(path):
+        return new_sketches(by, relative_accuracy)
+    with open(path, encoding='utf-8') as file:
+        state = json.load(file)
+    sketches = {'by': state['by'], 'relative_accuracy': state['relative_accuracy'], 'groups': {}}
+    model = state['by'].index('Model') if 'Model' in state['by'] else None
+    for group in state['groups']:
+        key = [_decode_key_part(part) for part in group['key']]
+        if model is not None:
+            # Sketches saved before the model registry keep the scraper's spelling; merge them into the canonical name
+            key[model] = normalise_models(pd.Series([key[model]]))[0]
+        sketch = {'offset': group['offset'], 'counts': np.array(group['counts'], dtype=np.int64), 'zero_count': group['zero_count']}
+        existing = sketches['groups'].get(tuple(key))
+        sketches['groups'][tuple(key)] = sketch if existing is None else merge_sketches(existing, sketch)
+    return sketches
+
+def filter_new_listings(new_data, sketch_path, column='listing_price', by='Model', min_listings=0, history=None):
+    # Fold a new day's listings into the persisted sketches and filter them against the updated fences.
+    # With history (all earlier, unfiltered listings) the fences are instead recomputed exactly, for validation;
+    # the persisted sketches are then left alone, so validating a day does not count it before its real run.
+    keys = [by] if isinstance(by, str) else list(by)
+    if history is not None:
+        bounds = outlier_bounds(pd.concat([history, new_data], ignore_index=True), column=column, by=keys)
+        return apply_outlier_bounds(new_data, bounds, column=column, by=keys, min_listings=min_listings)
+    sketches = load_sketches(sketch_path, by)
+    update_sketches(sketches, new_data, column)
+    save_sketches(sketch_path, sketches)
+    return apply_outlier_bounds(new_data, sketch_bounds(sketches), column=column, by=sketches['by'], min_listings=min_listings)
+
+def compare_bounds(sketches, history, column='listing_price'):
+    # Exact fences from the full history next to the sketched ones, with their relative differences
+    exact = outlier_bounds(history, column=column, by=sketches['by'])
+    sketched = sketch_bounds(sketches).reindex(exact.index)
+    comparison = exact.join(sketched, rsuffix='_sketch')
+    for statistic in ['Q1', 'Q3', 'lower_bound', 'upper_bound']:
+        comparison[f'{statistic}_error'] = (comparison[f'{statistic}_sketch'] - comparison[statistic]).abs() / comparison[statistic].abs()
+    return comparison
@@ -0,0 +1,95 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+from dataclean import rolled_price_panel
+
+# Rolling prices kept up to date one scrape at a time. Per model the state holds the listing count and
+# price sum of its last rollback_days observed dates, and Welford accumulators (count, mean, M2) over
+# every rolled price so far, so a new date costs O(rollback_days) per model instead of the whole history.
+
+def new_rolling_state(rollback_days):
+    return {'rollback_days': rollback_days, 'models': {}}
+
+def _new_model_state():
+    return {'last_date': None, 'window': [], 'rolled': None, 'first_rolled': None, 'periods': 0, 'mean': 0.0, 'm2': 0.0}
+
+def update_rolling_state(state, data, by='Model', date_column='Date', price_column='listing_price'):
+    # Fold listings of dates newer than each model's last absorbed date into the state, in date order.
+    # Dates already absorbed are skipped, so re-running a day's update changes nothing.
+    data = data.dropna(subset=[date_column, by])
+    daily = data.groupby([date_column, by], sort=True, observed=True)[price_column].agg(['count', 'sum'])
+    rollback_days = state['rollback_days']
+    absorbed = []
+    for (date, model), (count, total) in zip(daily.index, daily.itertuples(index=False, name=None)):
+        day = pd.Timestamp(date).strftime('%Y-%m-%d')
+        model_state = state['models'].setdefault(model, _new_model_state())
+        if model_state['last_date'] is not None and day <= model_state['last_date']:
+            continue
+        model_state['last_date'] = day
+        model_state['window'] = (model_state['window'] + [[day, int(count), float(total)]])[-rollback_days:]
+        absorbed.append((day, model))
+        if len(model_state['window']) < rollback_days:
+            continue
+
+        # Listing-weighted mean over the window, then one Welford step for the rolled series
+        window_count = sum(entry[1] for entry in model_state['window'])
+        window_total = sum(entry[2] for entry in model_state['window'])
+        rolled = window_total / window_count if window_count else np.nan
+        model_state['rolled'] = rolled
+        if model_state['first_rolled'] is None:
+            model_state['first_rolled'] = rolled
+        if np.isnan(rolled):
+            continue  # Skipped by the standard deviation, as pandas skips NaN
+        model_state['periods'] += 1
+        delta = rolled - model_state['mean']
+        model_state['mean'] += delta / model_state['periods']
+        model_state['m2'] += delta * (rolled - model_state['mean'])
+    return absorbed
+
+def rolling_statistics(state):
+    # Latest rolled price and the running statistics of the rolled series, one row per model
+    rows = []
+    for model, model_state in sorted(state['models'].items()):
+        periods = model_state['periods']
+        rows.append({
+            'Model': model,
+            'Last Date': pd.Timestamp(model_state['last_date']) if model_state['last_date'] else pd.NaT,
+            'Rolled Price': model_state['rolled'] if model_state['rolled'] is not None else np.nan,
+            'First Price': model_state['first_rolled'] if model_state['first_rolled'] is not None else np.nan,
+            'Periods': periods,
+            'Mean': model_state['mean'] if periods else np.nan,
+            'Standard Deviation': np.sqrt(model_state['m2'] / (periods - 1)) if periods > 1 else np.nan
+        })
+    return pd.DataFrame(rows, columns=['Model', 'Last Date', 'Rolled Price', 'First Price', 'Periods', 'Mean', 'Standard Deviation']).set_index('Model')
+
+def save_rolling_state(path, state):
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+def load_rolling_state(path, rollback_days):
+    if not os.path.exists(path):
+        return new_rolling_state(rollback_days)
+    with open(path, encoding='utf-8') as file:
+        state = json.load(file)
+    if state['rollback_days'] != rollback_days:
+        raise ValueError(f"{path} holds a {state['rollback_days']}-day rolling state, not {rollback_days} days")
+    return state
+
+def compare_rolling_state(state, history, by='Model', date_column='Date', price_column='listing_price'):
+    # The state's statistics next to a batch computation over the full history, with their absolute differences
+    panel = rolled_price_panel(history, state['rollback_days'], by=by, date_column=date_column, price_column=price_column)
+    grouped = panel.groupby(by, sort=True, observed=True)['Rolled Price']
+    batch = pd.DataFrame({
+        'Rolled Price': grouped.last(),
+        'First Price': grouped.first(),
+        'Periods': grouped.count(),
+        'Mean': grouped.mean(),
+        'Standard Deviation': grouped.std()
+    })
+    incremental = rolling_statistics(state).reindex(batch.index)
+    comparison = batch.join(incremental, rsuffix='_state')
+    for statistic in ['Rolled Price', 'First Price', 'Periods', 'Mean', 'Standard Deviation']:
+        comparison[f'{statistic}_error'] = (comparison[f'{statistic}_state'] - comparison[statistic]).abs()
+    return comparison
@@ -0,0 +1,236 @@
+import pandas as pd
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+import quantilesketch
+from dataclean import (parse_snapshot_filename, read_snapshot_csv, build_manifest, file_sha256, normalise_models, resolve_prefixes,
+                       new_read_cache, prefetch_snapshots, outlier_bounds, apply_outlier_bounds, CLEANING_VERSION)
+
+# Columnar copy of the daily scraper snapshots, one Parquet file per series and day:
+#   <store_directory>/series=<series>/day=<YYYY-MM-DD>/part-0.parquet
+SCHEMA = pa.schema([
+    ('date', pa.timestamp('ns')),
+    ('Model', pa.string()),
+    ('Capacity', pa.string()),
+    ('listing_price', pa.float64()),
+    ('Link', pa.string()),
+    ('Description', pa.string())
+])
+
+# Record of the CSV files absorbed into the store, with the size, mtime and hash they had at the time
+WATERMARK_FILENAME = '_watermark.json'
+
+# Cleaned listings, one directory per series and outlier grouping (named by a hash of them) under the store:
+#   <store_directory>/cleaned/<setup>/iphone_<series>_<YYYY-MM-DD>.parquet
+# next to the quantile sketches of the series and _cleaned.json, which names the files cleaned so far (with the
+# hash they were cleaned at) and the sketches file that holds exactly those files. The partitions are filtered
+# by the fences only; min_listings is applied when they are read, against the group sizes over every file.
+CLEANED_DIRECTORY = 'cleaned'
+CLEANED_FILENAME = '_cleaned.json'
+
+def partition_path(store_directory, filename):
+    series, date = parse_snapshot_filename(filename)
+    return os.path.join(store_directory, f'series={series}', f'day={date}', 'part-0.parquet')
+
+def is_imported(store_directory, filename, snapshot=None):
+    if parse_snapshot_filename(filename) is None:
+        return False
+    if snapshot is None:
+        return os.path.exists(partition_path(store_directory, filename))
+    # With a manifest entry, only a copy of the file as it is on disk now counts as imported
+    absorbed = load_watermark(store_directory).get(filename)
+    return absorbed is not None and (absorbed['size'], absorbed['mtime']) == (snapshot['size'], snapshot['mtime'])
+
+_watermark_cache = {}
+
+def load_watermark(store_directory):
+    path = os.path.join(store_directory, WATERMARK_FILENAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _watermark_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as file:
+            cached = (mtime, json.load(file))
+        _watermark_cache[path] = cached
+    return cached[1]
+
+def save_watermark(store_directory, watermark):
+    os.makedirs(store_directory, exist_ok=True)
+    path = os.path.join(store_directory, WATERMARK_FILENAME)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(watermark, file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+def write_partition(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+    # Write to a temporary file first so a partially written partition is never picked up
+    temp_path = path + '.tmp'
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+def ingest_snapshots(directory, store_directory, manifest=None):
+    if manifest is None:
+        manifest = build_manifest(directory)
+    watermark = dict(load_watermark(store_directory))
+    ingested = []
+    for filename in manifest['filenames']:
+        snapshot = manifest['snapshots'][filename]
+        if snapshot['series'] is None:
+            continue
+        absorbed = watermark.get(filename)
+        if absorbed is not None and (absorbed['size'], absorbed['mtime']) == (snapshot['size'], snapshot['mtime']):
+            continue  # Unchanged since the last ingest, not even hashed
+
+        file_path = os.path.join(directory, filename)
+        sha256 = file_sha256(file_path)
+        if absorbed is None or absorbed['sha256'] != sha256 or not os.path.exists(partition_path(store_directory, filename)):
+            write_partition(read_snapshot_csv(file_path), partition_path(store_directory, filename))
+            ingested.append(filename)
+        # A touched but identical file only moves its watermark
+        watermark[filename] = {'size': snapshot['size'], 'mtime': snapshot['mtime'], 'sha256': sha256}
+    save_watermark(store_directory, watermark)
+    return ingested
+
+def read_snapshot(store_directory, filename, columns=None):
+    # Only the partition of the requested file is opened, and only the requested columns decoded
+    table = pq.read_table(partition_path(store_directory, filename), columns=columns, schema=SCHEMA)
+    df = table.to_pandas()
+    if 'Model' in df.columns:
+        df['Model'] = normalise_models(df['Model'])  # Partitions written before the registry keep the scraper's spelling
+    return df
+
+def cleaned_directory(store_directory, series, prefixes, outlier_by='Model'):
+    description = {
+        'series': series,
+        'prefixes': [prefixes] if isinstance(prefixes, str) else list(prefixes),
+        'outlier_by': [outlier_by] if isinstance(outlier_by, str) else list(outlier_by),
+        'cleaning': CLEANING_VERSION  # Listings cleaned the old way are never read back
+    }
+    name = hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(store_directory, CLEANED_DIRECTORY, name)
+
+def _read_cleaned_state(path):
+    try:
+        with open(os.path.join(path, CLEANED_FILENAME), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'files': {}, 'sketches': None}
+
+def _cleaned_path(path, filename):
+    return os.path.join(path, filename[:-len('.csv')] + '.parquet')
+
+def clean_new_snapshots(store_directory, manifest, series, prefixes, min_listings=0, outlier_by='Model', columns=None, workers=None):
+    # The cleaned listings of one series, running the outlier step over only the ingested files it has not seen.
+    # The first run (or a run after a cleaned file changed or went away, which cannot be taken back out of the
+    # sketches) cleans the whole backlog against the exact fences of remove_outliers, so it keeps the same
+    # listings as get_combined_clean_data without a store. A later file is folded into the series' sketches and
+    # filtered against the fences as they stand with it (as quantilesketch.filter_new_listings does for a new
+    # day), so a day costs one file and earlier files are never cleaned again; its fences therefore come from
+    # the history up to it, not from files that arrive after. Groups with fewer than min_listings listings over
+    # every file so far are dropped on the way out, as remove_outliers drops them. Returns the cleaned frame (None when the series has no
+    # snapshots) and the number of listings dropped in this run.
+    keys = [outlier_by] if isinstance(outlier_by, str) else list(outlier_by)
+    path = cleaned_directory(store_directory, series, prefixes, keys)
+    absorbed = load_watermark(store_directory)
+    filenames = [filename for filename in resolve_prefixes(manifest, prefixes) if filename in absorbed]
+    if not filenames:
+        return None, 0
+    state = _read_cleaned_state(path)
+    if any(state['files'].get(filename, absorbed[filename]['sha256']) != absorbed[filename]['sha256'] for filename in filenames) \
+            or set(state['files']) - set(filenames):
+        shutil.rmtree(path)
+        state = _read_cleaned_state(path)
+
+    new = [filename for filename in filenames if filename not in state['files']]
+    removed = 0
+    if new:
+        os.makedirs(path, exist_ok=True)
+        cache = new_read_cache(manifest, {series: new})
+        if workers is not None and workers > 1:
+            prefetch_snapshots(manifest, new, cache, store_directory=store_directory, workers=workers)
+
+        def load(filename):
+            df = cache['frames'].pop(filename, None)
+            return read_snapshot(store_directory, filename) if df is None else df
+
+        if state['sketches'] is None:
+            # Nothing cleaned yet: one exact pass over the backlog, after which the sketches hold all of it
+            sketches = quantilesketch.new_sketches(keys)
+            frames = [load(filename) for filename in new]
+            bounds = outlier_bounds(pd.concat(frames, ignore_index=True), by=keys)
+            for df in frames:
+                quantilesketch.update_sketches(sketches, df)
+            cleaned = [apply_outlier_bounds(df, bounds, by=keys) for df in frames]
+        else:
+            sketches = quantilesketch.load_sketches(os.path.join(path, state['sketches']), keys)
+            cleaned = []
+            for filename in new:
+                df = load(filename)
+                quantilesketch.update_sketches(sketches, df)
+                cleaned.append(apply_outlier_bounds(df, quantilesketch.sketch_bounds(sketches), by=keys))
+        for filename, (cleaned_df, removed_count) in zip(new, cleaned):
+            write_partition(cleaned_df, _cleaned_path(path, filename))
+            removed += removed_count
+        state['files'].update({filename: absorbed[filename]['sha256'] for filename in new})
+        # The sketches go to a new file that the state then points at, so an interrupted run never leaves
+        # sketches that count files the state does not list
+        previous = state['sketches']
+        state['sketches'] = f'sketches-{len(state["files"])}.json'
+        quantilesketch.save_sketches(os.path.join(path, state['sketches']), sketches)
+        with open(os.path.join(path, CLEANED_FILENAME + '.tmp'), 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=1, sort_keys=True)
+        os.replace(os.path.join(path, CLEANED_FILENAME + '.tmp'), os.path.join(path, CLEANED_FILENAME))
+        if previous is not None and previous != state['sketches']:
+            os.remove(os.path.join(path, previous))
+
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + keys))
+    df = pa.concat_tables([pq.read_table(_cleaned_path(path, filename), columns=read_columns, schema=SCHEMA) for filename in filenames]).to_pandas()
+    if min_listings:
+        # Group sizes over every listing of every file, as remove_outliers counts them; only the key columns are read
+        sizes = pd.concat([read_snapshot(store_directory, filename, columns=keys) for filename in filenames], ignore_index=True).groupby(keys).size()
+        row_keys = pd.MultiIndex.from_frame(df[keys]) if len(keys) > 1 else pd.Index(df[keys[0]])
+        keep = sizes.reindex(row_keys).to_numpy() >= min_listings
+        removed += int(len(df) - keep.sum())
+        df = df[keep].reset_index(drop=True)
+    return (df if columns is None else df[list(columns)]), removed
+
+def check_store(directory, manifest=None):
+    # Ingest every snapshot into a temporary store and compare each partition with a direct CSV read.
+    # Returns the filenames whose partition differs (an exception means the store is broken outright).
+    if manifest is None:
+        manifest = build_manifest(directory)
+    mismatched = []
+    with tempfile.TemporaryDirectory() as store_directory:
+        ingested = ingest_snapshots(directory, store_directory, manifest=manifest)
+        for filename in ingested:
+            expected = read_snapshot_csv(os.path.join(directory, filename))[SCHEMA.names].reset_index(drop=True)
+            stored = read_snapshot(store_directory, filename)[SCHEMA.names]
+            # Missing text comes back from Parquet as None where the CSV reader gives NaN
+            expected = expected.astype(object).where(expected.notna(), None)
+            stored = stored.astype(object).where(stored.notna(), None)
+            try:
+                pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+            except AssertionError:
+                mismatched.append(filename)
+        if ingest_snapshots(directory, store_directory, manifest=manifest):
+            raise RuntimeError("A second ingest of unchanged files wrote partitions again")
+    return mismatched
+
+if __name__ == "__main__":
+    # Usage: python snapshotstore.py <csv directory> <store directory>
+    #        python snapshotstore.py --check <csv directory>
+    if sys.argv[1] == '--check':
+        mismatched = check_store(sys.argv[2])
+        print(f"{len(mismatched)} snapshot files differ between the CSV and the store" + (f": {mismatched}" if mismatched else ''))
+        sys.exit(1 if mismatched else 0)
+    ingested = ingest_snapshots(sys.argv[1], sys.argv[2])
+    print(f"Ingested {len(ingested)} new or changed snapshot files into {sys.argv[2]}")
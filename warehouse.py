@@ -0,0 +1,163 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import sqlite3
+from dataclean import read_snapshot_csv, build_manifest, file_sha256, CLEANING_VERSION
+
+# Local SQLite copy of the scraper output for ad-hoc questions. Prices are whole cents and dates ISO
+# 'YYYY-MM-DD' text, so range filters compare directly. The (Model, Capacity, date, price_cents) index
+# covers the usual filters and the price itself, so aggregations never touch the table rows.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    listing_id INTEGER,
+    snapshot TEXT NOT NULL,
+    series TEXT NOT NULL,
+    date TEXT,
+    Model TEXT,
+    Capacity TEXT,
+    price_cents INTEGER,
+    Link TEXT,
+    Description TEXT
+);
+CREATE INDEX IF NOT EXISTS listings_model_capacity_date ON listings (Model, Capacity, date, price_cents);
+CREATE INDEX IF NOT EXISTS listings_snapshot ON listings (snapshot);
+CREATE TABLE IF NOT EXISTS snapshots (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+# Marktplaats advert number in the listing URL, e.g. .../m2122080915-iphone-13-groen-128gb
+LISTING_ID = r'/m(\d+)-'
+COLUMNS = ['listing_id', 'snapshot', 'series', 'date', 'Model', 'Capacity', 'price_cents', 'Link', 'Description']
+
+def connect(database_path):
+    connection = sqlite3.connect(database_path)
+    connection.execute('PRAGMA journal_mode=WAL')  # Readers are not blocked while an import is running
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    # Rows loaded by an older version of the cleaning are re-imported: forgetting the snapshots makes the
+    # next import replace every file's rows
+    if connection.execute('PRAGMA user_version').fetchone()[0] != CLEANING_VERSION:
+        with connection:
+            connection.execute('DELETE FROM snapshots')
+            connection.execute(f'PRAGMA user_version = {CLEANING_VERSION}')
+    return connection
+
+def listing_rows(df, filename, series):
+    # The scraper wrote some descriptions into the Link column and the URL into Description, so both are searched
+    listing_id = df['Link'].astype(str).str.extract(LISTING_ID)[0].combine_first(df['Description'].astype(str).str.extract(LISTING_ID)[0])
+    prices = df['listing_price'].to_numpy(dtype=np.float64)
+    rows = pd.DataFrame({
+        'listing_id': pd.to_numeric(listing_id).astype('Int64'),
+        'snapshot': filename,
+        'series': series,
+        'date': df['date'].dt.strftime('%Y-%m-%d'),
+        'Model': df['Model'],
+        'Capacity': df['Capacity'],
+        'price_cents': pd.array(np.where(np.isnan(prices), np.nan, np.rint(prices * 100)), dtype='Int64'),
+        'Link': df['Link'],
+        'Description': df['Description']
+    })
+    # Missing values of any dtype become NULL
+    return rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+
+def import_snapshots(directory, database_path, manifest=None):
+    if manifest is None:
+        manifest = build_manifest(directory)
+    connection = connect(database_path)
+    imported = []
+    try:
+        known = {filename: (size, mtime, sha256) for filename, size, mtime, sha256 in connection.execute('SELECT filename, size, mtime, sha256 FROM snapshots')}
+        for filename in manifest['filenames']:
+            snapshot = manifest['snapshots'][filename]
+            if snapshot['series'] is None:
+                continue
+            absorbed = known.get(filename)
+            if absorbed is not None and absorbed[:2] == (snapshot['size'], snapshot['mtime']):
+                continue  # Unchanged since the last import, not even hashed
+
+            file_path = os.path.join(directory, filename)
+            sha256 = file_sha256(file_path)
+            # One transaction per file: its old rows, new rows and bookkeeping change together or not at all
+            with connection:
+                if absorbed is None or absorbed[2] != sha256:
+                    df = read_snapshot_csv(file_path)
+                    connection.execute('DELETE FROM listings WHERE snapshot = ?', (filename,))
+                    connection.executemany(f"INSERT INTO listings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                                           listing_rows(df, filename, snapshot['series']))
+                    rows = len(df)
+                    imported.append(filename)
+                else:
+                    rows = connection.execute('SELECT rows FROM snapshots WHERE filename = ?', (filename,)).fetchone()[0]
+                connection.execute('INSERT OR REPLACE INTO snapshots (filename, size, mtime, sha256, rows) VALUES (?, ?, ?, ?, ?)',
+                                   (filename, snapshot['size'], snapshot['mtime'], sha256, rows))
+    finally:
+        connection.close()
+    return imported
+
+def _where(model=None, capacity=None, start=None, end=None, series=None):
+    # Filters as SQL conditions with bound parameters; lists become IN (...)
+    conditions = []
+    parameters = []
+    for column, value in [('Model', model), ('Capacity', capacity), ('series', series)]:
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+        parameters.extend(values)
+    if start is not None:
+        conditions.append('date >= ?')
+        parameters.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        conditions.append('date <= ?')
+        parameters.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    conditions.append('price_cents IS NOT NULL')
+    return ' AND '.join(conditions), parameters
+
+def query_listings(connection, model=None, capacity=None, start=None, end=None, series=None, columns=('date', 'Model', 'Capacity', 'price_cents')):
+    where, parameters = _where(model, capacity, start, end, series)
+    df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM listings WHERE {where} ORDER BY date", connection, params=parameters)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    if 'price_cents' in df.columns:
+        df['listing_price'] = df['price_cents'] / 100
+    return df
+
+def price_summary(connection, by=('Model',), model=None, capacity=None, start=None, end=None, series=None):
+    # Count, mean, min, median and max price in euros per group, all computed by SQLite
+    by = [by] if isinstance(by, str) else list(by)
+    where, parameters = _where(model, capacity, start, end, series)
+    keys = ', '.join(by)
+    partition = f'PARTITION BY {keys} ' if by else ''
+    # The median is the mean of the middle one or two prices, found by numbering the prices within each group
+    query = f"""
+        SELECT {keys + ', ' if by else ''}COUNT(*) AS count, AVG(price_cents) / 100.0 AS mean, MIN(price_cents) / 100.0 AS min,
+               AVG(CASE WHEN position IN ((size + 1) / 2, (size + 2) / 2) THEN price_cents END) / 100.0 AS median,
+               MAX(price_cents) / 100.0 AS max
+        FROM (SELECT {keys + ', ' if by else ''}price_cents,
+                     ROW_NUMBER() OVER ({partition}ORDER BY price_cents) AS position,
+                     COUNT(*) OVER ({partition.strip()}) AS size
+              FROM listings WHERE {where})
+        {'GROUP BY ' + keys + ' ORDER BY ' + keys if by else ''}
+    """
+    summary = pd.read_sql_query(query, connection, params=parameters)
+    return summary.set_index(by) if by else summary
+
+def daily_prices(connection, model=None, capacity=None, start=None, end=None, series=None):
+    # Mean price per day and model, the table the analysis scripts pivot before rolling
+    where, parameters = _where(model, capacity, start, end, series)
+    daily = pd.read_sql_query(f'SELECT date, Model, AVG(price_cents) / 100.0 AS listing_price FROM listings WHERE {where} GROUP BY date, Model ORDER BY date, Model',
+                              connection, params=parameters)
+    daily['date'] = pd.to_datetime(daily['date'])
+    return daily.pivot(index='date', columns='Model', values='listing_price')
+
+if __name__ == "__main__":
+    # Usage: python warehouse.py <csv directory> <database path>
+    imported = import_snapshots(sys.argv[1], sys.argv[2])
+    print(f"Imported {len(imported)} new or changed snapshot files into {sys.argv[2]}")